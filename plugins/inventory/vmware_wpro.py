@@ -0,0 +1,150 @@
+# Copyright: (c) 2023, Eddy Vermoen (@ben-eddy74)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+name: vmware_wpro
+
+short_description: VMware Workstation Pro inventory source
+version_added: "1.0.0"
+
+description:
+    - Returns every virtual machine registered in the VMware Workstation Pro inventory as a host.
+    - The host name is the vmx file name, or the display name when several virtual machines share a vmx file name.
+    - Hosts are grouped by power state, guest OS and inventory folder.
+    - Facts read from the vmx files are cached and only refreshed when the vmx file changes.
+    - Uses a YAML configuration file that ends with vmware_wpro.yml or vmware_wpro.yaml.
+
+extends_documentation_fragment:
+    - constructed
+    - inventory_cache
+
+options:
+    plugin:
+        description: Token that ensures this is a source file for the plugin
+        required: true
+        choices: ['ben_eddy74.vmware_wpro.vmware_wpro']
+    power_state:
+        description: Determine the power state of the virtual machines, this runs vmrun list once per refresh
+        type: bool
+        default: true
+
+author:
+    - Eddy Vermoen (@ben-eddy74)
+'''
+
+EXAMPLES = r'''
+# vmware_wpro.yml
+plugin: ben_eddy74.vmware_wpro.vmware_wpro
+cache: true
+cache_plugin: ansible.builtin.jsonfile
+cache_connection: ~/.cache/vmware_wpro/inventory
+keyed_groups:
+    - key: vmware_numvcpus
+      prefix: vcpus
+'''
+
+import os
+from ansible.plugins.inventory import BaseInventoryPlugin, Constructable, Cacheable
+try:
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware import HostContext, VMWare
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_powerstate import PowerState
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_vm import VM
+except:
+    from module_utils.vmware import HostContext, VMWare
+    from module_utils.vmware_powerstate import PowerState
+    from module_utils.vmware_vm import VM
+
+class InventoryModule(BaseInventoryPlugin, Constructable, Cacheable):
+
+    NAME = 'ben_eddy74.vmware_wpro.vmware_wpro'
+
+    def verify_file(self, path):
+        return super(InventoryModule, self).verify_file(path) and path.endswith(('vmware_wpro.yml', 'vmware_wpro.yaml'))
+
+    def parse(self, inventory, loader, path, cache=True):
+        super(InventoryModule, self).parse(inventory, loader, path, cache)
+        self._read_config_data(path)
+
+        cache_key = self.get_cache_key(path)
+        user_cache_setting = self.get_option('cache')
+        cached = dict()
+        if user_cache_setting and cache:
+            try:
+                cached = self._cache[cache_key]
+            except KeyError:
+                pass
+
+        host = HostContext()
+        vmware = VMWare(host)
+        index = vmware.getInventoryIndex()
+        # The vmx path of every entry is known, VMs sharing a vmx basename get a unique host name
+        entries = index.hostnames()
+        vms = [VM.fromPath(name, entry['config'], host) for name, entry in entries.items()]
+
+        facts = self._facts(vmware, vms, cached)
+        if user_cache_setting:
+            self._cache[cache_key] = facts
+
+        states = PowerState(vmware).evaluate(vms) if self.get_option('power_state') else dict()
+        for name, entry in entries.items():
+            vmfacts = facts.get(entry['config'].casefold())
+            if vmfacts == None:
+                continue
+            hostvars = dict(vmfacts['hostvars'])
+            hostvars['vmware_name'] = name
+            hostvars['vmware_folder'] = index.folder(entry)
+            hostvars['vmware_display_name'] = entry['displayName']
+            if name in states:
+                hostvars['vmware_power_state'] = states[name]
+            self._populate(name, hostvars)
+
+    def _facts(self, vmware, vms, cached):
+        """Returns the hostvars by casefolded vmx path, only the vmx files that changed since the cached run are read"""
+        facts = dict()
+        for vm in vms:
+            vmx = vm.getPath()
+            path = vmx.casefold()
+            try:
+                stat = os.stat(vmware.tolocalpath(vmx))
+            except OSError:
+                continue
+            key = [stat.st_mtime, stat.st_size]
+            if path in cached and cached[path]['key'] == key:
+                facts[path] = cached[path]
+                continue
+
+            config = vm.facts()['config']
+            facts[path] = dict(key= key, hostvars= dict(
+                vmware_name= vm.name,
+                vmware_vmx= vmx,
+                vmware_guestos= config.get('guestOS', ''),
+                vmware_memsize= int(config.get('memsize', 0)),
+                vmware_numvcpus= int(config.get('numvcpus', 1)),
+                vmware_mac= config.get('ethernet0.address', config.get('ethernet0.generatedAddress', '')),
+                vmware_uuid= config.get('uuid.bios', ''),
+            ))
+        return facts
+
+    def _populate(self, name, hostvars):
+        self.inventory.add_host(name)
+        for key, value in hostvars.items():
+            self.inventory.set_variable(name, key, value)
+
+        groups = []
+        if 'vmware_power_state' in hostvars:
+            groups.append('power_' + hostvars['vmware_power_state'])
+        if hostvars['vmware_guestos'] != '':
+            groups.append('guestos_' + hostvars['vmware_guestos'])
+        if hostvars['vmware_folder'] != '':
+            groups.append('folder_' + hostvars['vmware_folder'])
+        for group in groups:
+            group = self.inventory.add_group(self._sanitize_group_name(group))
+            self.inventory.add_child(group, name)
+
+        strict = self.get_option('strict')
+        self._set_composite_vars(self.get_option('compose'), hostvars, name, strict= strict)
+        self._add_host_to_composed_groups(self.get_option('groups'), hostvars, name, strict= strict)
+        self._add_host_to_keyed_groups(self.get_option('keyed_groups'), hostvars, name, strict= strict)
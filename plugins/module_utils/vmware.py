@@ -1,11 +1,103 @@
-import subprocess, re
+import fnmatch, os, subprocess, re, threading
+
+try:
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_bridge import InteropBridge
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_cache import FileCache, ParseCache, cachedir, lockfile
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_executor import Executor
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_inventory import Inventory
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_vmx import VmxDocument
+except:
+    from module_utils.vmware_bridge import InteropBridge
+    from module_utils.vmware_cache import FileCache, ParseCache, cachedir, lockfile
+    from module_utils.vmware_executor import Executor
+    from module_utils.vmware_inventory import Inventory
+    from module_utils.vmware_vmx import VmxDocument
+
+# Parsed vmx, inventory and preferences files of this process, see VMWARE_WPRO_PARSE_CACHE
+PARSECACHE = ParseCache(persistent= os.environ.get('VMWARE_WPRO_PARSE_CACHE', '') in ('1', 'true', 'yes'))
+
+class HostContext:
+    """Host discovery results shared by all VMWare objects of a module run"""
+
+    def __init__(self, bridge= None, concurrency= None, timeout= None) -> None:
+        self.values = dict()
+        self.lock = threading.RLock()
+        self.bridge = bridge if bridge != None else InteropBridge.fromEnvironment()
+        if concurrency == None:
+            concurrency = int(os.environ.get('VMWARE_WPRO_CONCURRENCY', 4))
+        if timeout == None:
+            timeout = float(os.environ.get('VMWARE_WPRO_TIMEOUT', 0)) or None
+        self.executor = Executor(concurrency, timeout, self.bridge)
+
+    def get(self, key, compute):
+        with self.lock:
+            if key not in self.values:
+                self.values[key] = compute()
+            return self.values[key]
+
+    def invalidate(self, key):
+        with self.lock:
+            self.values.pop(key, None)
 
 class VMWare:
-    def __init__(self) -> None:
-        self.wsl = self.__isWsl()
-        self.registry = self.__registry()
-        self.configfiles = self.__configfiles()
-        self.runningvms = self.__runningvms()
+    def __init__(self, host= None) -> None:
+        # Host state is computed on first use and shared through the host context
+        self.host = host if host != None else HostContext()
+
+    @property
+    def hostfacts(self):
+        return self.host.get('hostfacts', self.__hostfacts)
+
+    @property
+    def wsl(self):
+        return self.hostfacts['wsl']
+
+    @property
+    def registry(self):
+        return self.hostfacts['registry']
+
+    @property
+    def configfiles(self):
+        return self.hostfacts['configfiles']
+
+    @property
+    def runningvms(self):
+        return self.host.get('runningvms', self.__runningvms)
+
+    # Static host facts, cached on disk to avoid the WSL interop calls
+    def __hostfacts(self):
+        cache = FileCache('hostfacts', int(os.environ.get('VMWARE_WPRO_CACHE_TTL', 86400)))
+        cached = cache.load()
+        if cached != None and cached['vmrun_mtime'] == self.__vmrunMtime(cached):
+            return cached
+
+        stale = cached if cached != None else FileCache('hostfacts', float('inf')).load()
+        if stale != None and stale['wsl']:
+            # Expired or vmrun.exe changed, only keep the facts when the product version is unchanged
+            registry = self.__registry(True)
+            if registry.get('ProductVersion') == stale['registry'].get('ProductVersion') and registry.get('InstallPath') == stale['registry'].get('InstallPath'):
+                stale['registry'] = registry
+                stale['vmrun_mtime'] = self.__vmrunMtime(stale)
+                cache.save(stale)
+                return stale
+
+        wsl = self.__isWsl()
+        result = dict(
+            wsl= wsl,
+            registry= self.__registry(wsl),
+            configfiles= self.__configfiles(wsl)
+        )
+        result['vmrun_mtime'] = self.__vmrunMtime(result)
+        cache.save(result)
+        return result
+
+    def __vmrunMtime(self, hostfacts):
+        if hostfacts['wsl'] == False or 'InstallPath' not in hostfacts['registry']:
+            return None
+        try:
+            return os.stat(self.towslpath(hostfacts['registry']['InstallPath']) + 'vmrun.exe').st_mtime
+        except OSError:
+            return None
 
     # WSL support
     def isWsl(self):
@@ -15,6 +107,10 @@ class VMWare:
         """Converts a Windows path to the corresponding WSL path"""
         return path.lower().replace('\\', '/').replace('c:', '/mnt/c')
 
+    def tolocalpath(self, path):
+        """Converts a path of the VMware host to a path usable by this process"""
+        return self.towslpath(path) if self.wsl else path
+
     def __isWsl(self):
         process = subprocess.run('whereis powershell.exe', capture_output=True, shell= True)
         return process.stdout.decode().strip('\r\n') == 'powershell.exe: /mnt/c/Windows/System32/WindowsPowerShell/v1.0/powershell.exe'
@@ -23,11 +119,12 @@ class VMWare:
     def getRegistry(self):
         return self.registry
     
-    def __registry(self):
+    def __registry(self, wsl):
         result = dict()
-        if self.wsl == False:
+        if wsl == False:
             return result
-        reg = subprocess.run('reg.exe query "HKLM\SOFTWARE\WOW6432Node\VMware, Inc.\VMware Workstation"', capture_output= True, shell= True)
+        query = 'reg.exe query "HKLM\SOFTWARE\WOW6432Node\VMware, Inc.\VMware Workstation"'
+        reg = self.shell(query, query)
         for line in reg.stdout.decode().split('\r\n'):
             if '    ' in line:
                 values = line.split('   ')
@@ -44,19 +141,48 @@ class VMWare:
     # Get inventory and preferences
     def getInventory(self):
         inifile = self.configfiles['inventory']
-        return self.___dict_from_ini(inifile)
+        return self.host.get('inventory', lambda: self.___dict_from_ini(inifile))
 
     def getPreferences(self):
         inifile = self.configfiles['preferences']
-        return self.___dict_from_ini(inifile)
+        return self.host.get('preferences', lambda: self.___dict_from_ini(inifile))
+
+    # Index of the inventory, cached on disk by modification time of inventory.vmls
+    def getInventoryIndex(self):
+        return self.host.get('inventoryindex', self.__inventoryIndex)
+
+    def __inventoryIndex(self):
+        try:
+            stat = os.stat(self.tolocalpath(self.configfiles['inventory']))
+            key = [stat.st_mtime, stat.st_size]
+        except OSError:
+            key = None
+        cache = FileCache('inventory', int(os.environ.get('VMWARE_WPRO_CACHE_TTL', 86400)))
+        cached = cache.load()
+        if cached != None and key != None and cached['key'] == key:
+            return Inventory.fromdict(cached)
+
+        inventory = Inventory.parse(self.getInventory())
+        if key != None:
+            cache.save(dict(key= key, **inventory.todict()))
+        return inventory
+
+    # Registered virtual machines by unique name, the name of the vmx file when no other VM shares it
+    def getInventoryVms(self):
+        return dict((name, vm['config']) for name, vm in self.getInventoryIndex().hostnames().items())
+
+    def findInventoryVms(self, pattern, regex= False):
+        """Returns the registered virtual machines whose unique name matches a shell pattern, or a regular expression with regex"""
+        pattern = re.compile(pattern if regex else fnmatch.translate(pattern), re.IGNORECASE)
+        return dict((name, vmx) for name, vmx in sorted(self.getInventoryVms().items()) if pattern.match(name))
 
     def getConfigfiles(self):
         return self.configfiles
     
-    def __configfiles(self):
+    def __configfiles(self, wsl):
         result = dict()
-        if self.wsl:
-            appdata = subprocess.run('cmd.exe /c echo %appdata%', capture_output=True, shell= True)
+        if wsl:
+            appdata = self.shell('cmd.exe /c echo %appdata%', 'echo %appdata%')
             result['appdata'] = appdata.stdout.decode().strip('\r\n') + '\\VMware\\'
         else:
             pass #TODO: VMware on Linux support
@@ -72,10 +198,13 @@ class VMWare:
     def __runningvms(self):
         result = dict()
         running = self.vmrun("list")
-        for line in running.split('\r\n'):
-            if 'Total running VMs' not in line and line != '':
-                name = re.findall('.*\\\\(.*)\.vmx', line) #TODO: or forward slash for linux path
-                result[name[0]] = line
+        if running.startswith('Error'):
+            # Without the list every power state would be wrong, for example after a timeout
+            raise Exception("vmrun list failed: {}".format(running.strip('\r\n')))
+        for line in running.splitlines():
+            name = re.findall(r'.*[\\/](.*)\.vmx$', line.strip(), re.IGNORECASE)
+            if 'Total running VMs' not in line and len(name) > 0:
+                result[name[0]] = line.strip()
         return result
     
     # Read vmx configuration and return as a dict
@@ -85,53 +214,111 @@ class VMWare:
     # Helper function to read an ini file into a dict
     def ___dict_from_ini(self, inifile):
         """Helper function to read an INI file into a dictionary"""
-        result = dict()
         if self.wsl:
             inifile = self.towslpath(inifile)
-        with open(inifile, 'r') as inifile:
-            for line in inifile:
-                kv = line.strip('\n').split('=')
-                result[kv[0].strip(' ')] = kv[1].strip(' ').strip('"')
-        return result
+        return PARSECACHE.get(inifile, self.___parse_ini)
 
-    # Write vmx configuration to ini file
-    def setVmxConfig(self, config):
-        currentconfig = self.getVmxConfig(self.vmpath)
+    def ___parse_ini(self, inifile):
+        return VmxDocument.read(inifile).todict()
+
+    # Write vmx configuration, only the changed keys are rewritten
+    def setVmxConfig(self, config, remove= [], dryrun= False):
+        """Applies the key/values and removes the keys from the vmx file.
+        Returns the changed keys with their before and after values, after is None for removed keys."""
+        vmxpath = self.tolocalpath(self.vmpath)
+        document = VmxDocument.read(vmxpath)
+        diff = dict()
         for k, v in config.items():
-            currentconfig[k] = v
+            before = document.get(k)
+            if document.set(k, v):
+                diff[k] = dict(before= before, after= str(v))
+        for k in remove:
+            before = document.get(k)
+            if document.remove(k):
+                diff[k] = dict(before= before, after= None)
 
-        return self.___dict_to_ini(self.vmpath, currentconfig)
-    
-    # Helper function to write an ini file into a dict
-    def ___dict_to_ini(self, inifile, config):
-        if self.wsl:
-            inifile = self.towslpath(inifile)
-        with open(inifile, 'w') as content:
-            for k, v in sorted(config.items()):
-                line = '{0} = "{1}"'.format(k, v)
-                print(line, file= content)
+        if dryrun == False:
+            document.write(vmxpath)
+        return diff
+
+    # Register a vm in the inventory, or rename a registered vm
+    def registerVm(self, vmxpath, displayname):
+        """Adds the vmx file to inventory.vmls with the display name, returns True when the inventory changed"""
+        inventorypath = self.tolocalpath(self.configfiles['inventory'])
+        with lockfile(os.path.join(cachedir(), 'inventory.lock')):
+            document = VmxDocument.read(inventorypath)
+            entries = [key[:-len('.config')] for key in document.keys() if re.match(r'^vmlist\d+\.config$', key, re.IGNORECASE)]
+            entry = next((entry for entry in entries if document.get(entry + '.config').casefold() == vmxpath.casefold()), None)
+            if entry == None:
+                entry = 'vmlist{}'.format(max([int(entry[len('vmlist'):]) for entry in entries] + [0]) + 1)
+                document.set(entry + '.config', vmxpath)
+            document.set(entry + '.DisplayName', displayname)
+            written = document.write(inventorypath)
+        self.host.invalidate('inventory')
+        self.host.invalidate('inventoryindex')
+        return written
+
+    def unregisterVm(self, vmxpath):
+        """Removes the vmx file from inventory.vmls, returns True when the inventory changed"""
+        inventorypath = self.tolocalpath(self.configfiles['inventory'])
+        with lockfile(os.path.join(cachedir(), 'inventory.lock')):
+            document = VmxDocument.read(inventorypath)
+            entries = [key[:-len('.config')] for key in document.keys() if re.match(r'^vmlist\d+\.config$', key, re.IGNORECASE)]
+            entry = next((entry for entry in entries if document.get(entry + '.config').casefold() == vmxpath.casefold()), None)
+            if entry == None:
+                return False
+            for key in [key for key in document.keys() if key.casefold().startswith(entry.casefold() + '.')]:
+                document.remove(key)
+            written = document.write(inventorypath)
+        self.host.invalidate('inventory')
+        self.host.invalidate('inventoryindex')
+        return written
+
+    # Run a command on the host, through the interop bridge when it is enabled
+    def shell(self, command, windowscommand= None, timeout= None):
+        return self.host.executor.runSync(command, windowscommand, timeout)
+
+    async def shellAsync(self, command, windowscommand= None, timeout= None):
+        return await self.host.executor.run(command, windowscommand, timeout)
 
     # VMware tools wrappers
-    def vmrun(self,  args):        
-        runnable = '';
-        if self.wsl:
-            runnable = '"{0}{1}" {2}'.format(self.towslpath(self.registry['InstallPath']), 'vmrun.exe', args)
-        else:
-            pass #TODO: VMware on Linux support
-        result = subprocess.run(runnable, capture_output=True, shell= True)
+    def vmrun(self, args, timeout= None):
+        return self.host.executor.call(self.vmrunAsync(args, timeout))
+
+    async def vmrunAsync(self, args, timeout= None):
+        try:
+            result = await self.shellAsync(*self.__toolcommand('vmrun.exe', args), timeout)
+        except subprocess.TimeoutExpired as e:
+            return 'Error: vmrun timed out after {} seconds'.format(e.timeout)
         return result.stdout.decode()
 
-    def vdiskmanager(self, args):
-        runnable = '';
-        if self.wsl:
-            runnable = '"{0}{1}" {2}'.format(self.towslpath(self.registry['InstallPath']), 'vmware-vdiskmanager.exe', args)
-        else:
-            pass #TODO: VMware on Linux support
-        result = subprocess.run(runnable, capture_output=True, shell= True)
+    def vdiskmanager(self, args, timeout= None):
+        return self.host.executor.call(self.vdiskmanagerAsync(args, timeout))
+
+    async def vdiskmanagerAsync(self, args, timeout= None):
+        try:
+            result = await self.shellAsync(*self.__toolcommand('vmware-vdiskmanager.exe', args), timeout)
+        except subprocess.TimeoutExpired as e:
+            return 'Failed: vmware-vdiskmanager timed out after {} seconds'.format(e.timeout)
         if result.stderr.decode() != "":
             return result.stderr.decode()
         
         return result.stdout.decode()
+
+    def vdiskmanagerCommand(self, args):
+        """Returns the command line of vmware-vdiskmanager, for callers that manage the process themselves"""
+        return self.__toolcommand('vmware-vdiskmanager.exe', args)[0]
+
+    def __toolcommand(self, tool, args):
+        """Returns the command line of a VMware tool, and the Windows command line for the interop bridge"""
+        runnable = '';
+        windowsrunnable = None
+        if self.wsl:
+            runnable = '"{0}{1}" {2}'.format(self.towslpath(self.registry['InstallPath']), tool, args)
+            windowsrunnable = '"{0}{1}" {2}'.format(self.registry['InstallPath'], tool, args)
+        else:
+            pass #TODO: VMware on Linux support
+        return runnable, windowsrunnable
     
 if __name__ == '__main__':
     vmware= VMWare()
@@ -0,0 +1,111 @@
+import atexit, base64, os, select, subprocess, time
+
+# Helper loop executed by the persistent powershell.exe process. Every request is a line
+# '<token> <base64 command>', the command is run by cmd.exe and answered with a line
+# '<token> <exitcode> <base64 stdout> <base64 stderr>'.
+POWERSHELL_HELPER = r'''
+$utf8 = New-Object System.Text.UTF8Encoding $false
+while (($line = [Console]::In.ReadLine()) -ne $null) {
+    $request = $line.Split(' ', 2)
+    $command = $utf8.GetString([Convert]::FromBase64String($request[1]))
+    $process = New-Object System.Diagnostics.Process
+    $process.StartInfo.FileName = 'cmd.exe'
+    $process.StartInfo.Arguments = '/s /c "' + $command + '"'
+    $process.StartInfo.UseShellExecute = $false
+    $process.StartInfo.RedirectStandardOutput = $true
+    $process.StartInfo.RedirectStandardError = $true
+    [void]$process.Start()
+    $stderr = $process.StandardError.ReadToEndAsync()
+    $stdout = $process.StandardOutput.ReadToEnd()
+    $process.WaitForExit()
+    $out = [Convert]::ToBase64String($utf8.GetBytes($stdout))
+    $err = [Convert]::ToBase64String($utf8.GetBytes($stderr.Result))
+    [Console]::Out.WriteLine($request[0] + ' ' + $process.ExitCode + ' ' + $out + ' ' + $err)
+    [Console]::Out.Flush()
+}
+'''
+
+class BridgeError(Exception):
+    pass
+
+class InteropBridge:
+    """Long-lived helper process executing Windows command lines received over stdin.
+    This avoids the cost of a WSL interop process launch for every command."""
+
+    def __init__(self, command= None) -> None:
+        if command == None:
+            script = base64.b64encode(POWERSHELL_HELPER.encode('utf-16-le')).decode()
+            command = 'powershell.exe -NoProfile -NonInteractive -EncodedCommand {}'.format(script)
+        self.command = command
+        self.process = None
+        self.buffer = b''
+        self.counter = 0
+        atexit.register(self.close)
+
+    @staticmethod
+    def fromEnvironment():
+        """Returns a bridge configured by VMWARE_WPRO_BRIDGE, or None when it is disabled.
+        Use 1 or powershell for the default helper, or the command line of a stand-in helper."""
+        setting = os.environ.get('VMWARE_WPRO_BRIDGE', '')
+        if setting in ('', '0', 'false', 'no'):
+            return None
+        if setting in ('1', 'true', 'yes', 'powershell'):
+            return InteropBridge()
+        return InteropBridge(setting)
+
+    def start(self):
+        self.process = subprocess.Popen(self.command, shell= True, stdin= subprocess.PIPE, stdout= subprocess.PIPE, stderr= subprocess.DEVNULL)
+        self.buffer = b''
+
+    def close(self):
+        if self.process != None:
+            if self.process.poll() == None:
+                self.process.kill()
+            self.process.wait()
+            self.process = None
+
+    def run(self, command, timeout= None):
+        """Runs a command line through the helper, returns a subprocess.CompletedProcess.
+        Raises subprocess.TimeoutExpired like subprocess.run, the helper is restarted on next use."""
+        if self.process == None or self.process.poll() != None:
+            self.start()
+        self.counter += 1
+        token = str(self.counter)
+        request = '{0} {1}\n'.format(token, base64.b64encode(command.encode()).decode())
+        try:
+            self.process.stdin.write(request.encode())
+            self.process.stdin.flush()
+        except OSError as e:
+            self.close()
+            raise BridgeError('Interop bridge is not available: {}'.format(e))
+
+        deadline = None if timeout == None else time.monotonic() + timeout
+        while True:
+            try:
+                line = self.__readline(deadline)
+            except BridgeError as e:
+                # The command may have been executed, so report instead of running it again
+                return subprocess.CompletedProcess(command, -1, b'', 'Error: {}'.format(e).encode())
+            if line == None:
+                self.close()
+                raise subprocess.TimeoutExpired(command, timeout)
+            response = line.decode().rstrip('\r\n').split(' ')
+            # Skip anything the helper prints that is not an answer to this request
+            if len(response) == 4 and response[0] == token:
+                return subprocess.CompletedProcess(command, int(response[1]), base64.b64decode(response[2]), base64.b64decode(response[3]))
+
+    def __readline(self, deadline):
+        """Reads one line from the helper, returns None when the deadline has passed"""
+        fd = self.process.stdout.fileno()
+        while b'\n' not in self.buffer:
+            remaining = None if deadline == None else max(0, deadline - time.monotonic())
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if ready == []:
+                return None
+            data = os.read(fd, 65536)
+            if data == b'':
+                self.close()
+                raise BridgeError('Interop bridge terminated')
+            self.buffer += data
+        line, self.buffer = self.buffer.split(b'\n', 1)
+        return line
@@ -0,0 +1,143 @@
+import copy, fcntl, hashlib, json, os, tempfile, threading, time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+def cachedir():
+    """Returns the directory used to store the on-disk caches of this collection"""
+    path = os.environ.get('VMWARE_WPRO_CACHE_DIR', '')
+    if path == '':
+        path = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'vmware_wpro')
+    return path
+
+@contextmanager
+def lockfile(path, blocking= True):
+    """Holds an exclusive lock on path for the duration of the context.
+    Yields False instead of waiting when blocking is off and another process holds the lock."""
+    os.makedirs(os.path.dirname(path), exist_ok= True)
+    with open(path, 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+class FileCache:
+    """JSON document stored in the cache directory, expired after ttl seconds"""
+
+    def __init__(self, name, ttl= 86400) -> None:
+        self.path = os.path.join(cachedir(), name + '.json')
+        self.ttl = ttl
+
+    def load(self):
+        """Returns the cached data or None when missing, unreadable or expired"""
+        if self.ttl <= 0:
+            return None
+        try:
+            with open(self.path, 'r') as content:
+                document = json.load(content)
+        except (OSError, ValueError):
+            return None
+        if time.time() - document.get('timestamp', 0) > self.ttl:
+            return None
+        return document.get('data')
+
+    def save(self, data):
+        """Atomically replaces the cached data, errors are ignored as the cache is optional"""
+        if self.ttl <= 0:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok= True)
+            fd, tmppath = tempfile.mkstemp(dir= os.path.dirname(self.path), prefix= '.tmp')
+            with os.fdopen(fd, 'w') as content:
+                json.dump(dict(timestamp= time.time(), data= data), content)
+            os.replace(tmppath, self.path)
+        except OSError:
+            pass
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+class ParseCache:
+    """Parsed content of files, keyed on path, mtime and size.
+    The most recently used entries are kept in memory, and optionally stored on disk
+    so that unchanged files are not parsed again by the next module run."""
+
+    def __init__(self, size= 256, persistent= False, disksize= 1024) -> None:
+        self.size = size
+        self.persistent = persistent
+        self.disksize = disksize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.directory = os.path.join(cachedir(), 'parsed')
+
+    def get(self, path, parse):
+        """Returns parse(path), or a copy of the cached result when the file didn't change"""
+        stat = os.stat(path)
+        key = [stat.st_mtime_ns, stat.st_size]
+
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry != None and entry[0] == key:
+                self.entries.move_to_end(path)
+                return copy.deepcopy(entry[1])
+
+        data = self.__load(path, key)
+        if data == None:
+            data = parse(path)
+            self.__save(path, key, data)
+
+        with self.lock:
+            self.entries[path] = (key, data)
+            self.entries.move_to_end(path)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last= False)
+        return copy.deepcopy(data)
+
+    def __diskpath(self, path):
+        return os.path.join(self.directory, hashlib.sha1(path.encode()).hexdigest() + '.json')
+
+    def __load(self, path, key):
+        if self.persistent == False:
+            return None
+        diskpath = self.__diskpath(path)
+        try:
+            with open(diskpath, 'r') as content:
+                document = json.load(content)
+            # Touch the entry, the least recently used entries are evicted first
+            os.utime(diskpath)
+        except (OSError, ValueError):
+            return None
+        if document.get('path') != path or document.get('key') != key:
+            return None
+        return document['data']
+
+    def __save(self, path, key, data):
+        if self.persistent == False:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok= True)
+            fd, tmppath = tempfile.mkstemp(dir= self.directory, prefix= '.tmp')
+            with os.fdopen(fd, 'w') as content:
+                json.dump(dict(path= path, key= key, data= data), content)
+            os.replace(tmppath, self.__diskpath(path))
+            self.__evict()
+        except (OSError, TypeError):
+            pass
+
+    def __evict(self):
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.json')]
+        if len(entries) <= self.disksize:
+            return
+        entries.sort(key= lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.disksize]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
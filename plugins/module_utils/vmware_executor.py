@@ -0,0 +1,105 @@
+import asyncio, functools, os, signal, subprocess, weakref
+
+try:
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_bridge import InteropBridge, BridgeError
+except:
+    from module_utils.vmware_bridge import InteropBridge, BridgeError
+
+class Executor:
+    """Runs host commands concurrently with asyncio.
+    At most limit commands run at the same time and every command can have a timeout in seconds."""
+
+    def __init__(self, limit= 4, timeout= None, bridge= None) -> None:
+        self.limit = max(1, limit)
+        self.timeout = timeout
+        self.semaphores = weakref.WeakKeyDictionary()
+        # Idle interop bridges, a new one is started when all of them are busy
+        self.bridge = bridge
+        self.bridges = [bridge] if bridge != None else []
+
+    # Synchronous entry points
+
+    def call(self, coroutine):
+        """Runs a single coroutine and returns its result"""
+        return asyncio.run(coroutine)
+
+    def gather(self, *coroutines):
+        """Runs the coroutines concurrently and returns their results in the same order.
+        A failing coroutine returns its exception instead of cancelling the others."""
+        if len(coroutines) == 0:
+            return []
+        return asyncio.run(self.__gather(coroutines))
+
+    async def __gather(self, coroutines):
+        return await asyncio.gather(*coroutines, return_exceptions= True)
+
+    def runSync(self, command, windowscommand= None, timeout= None):
+        """Blocking variant of run, for callers outside of the event loop"""
+        timeout = timeout if timeout != None else self.timeout
+        if self.bridge != None and windowscommand != None:
+            bridge = self.bridges.pop() if len(self.bridges) > 0 else InteropBridge(self.bridge.command)
+            try:
+                return bridge.run(windowscommand, timeout)
+            except BridgeError:
+                pass
+            finally:
+                self.bridges.append(bridge)
+        return subprocess.run(command, capture_output= True, shell= True, timeout= timeout)
+
+    # Coroutines
+
+    async def run(self, command, windowscommand= None, timeout= None):
+        """Runs a command line and returns a subprocess.CompletedProcess.
+        The Windows command line is used when an interop bridge is available.
+        Raises subprocess.TimeoutExpired when the command takes longer than the timeout."""
+        timeout = timeout if timeout != None else self.timeout
+        async with self.__semaphore():
+            if self.bridge != None and windowscommand != None:
+                try:
+                    return await self.__bridged(windowscommand, timeout)
+                except BridgeError:
+                    pass
+            return await self.__subprocess(command, timeout)
+
+    async def thread(self, function, *args, **kwargs):
+        """Runs a blocking function in a worker thread, within the concurrency limit"""
+        async with self.__semaphore():
+            return await asyncio.get_running_loop().run_in_executor(None, functools.partial(function, *args, **kwargs))
+
+    def __semaphore(self):
+        # Every event loop gets its own semaphore, asyncio primitives can't be shared between loops
+        loop = asyncio.get_running_loop()
+        if loop not in self.semaphores:
+            self.semaphores[loop] = asyncio.Semaphore(self.limit)
+        return self.semaphores[loop]
+
+    async def __subprocess(self, command, timeout):
+        process = await asyncio.create_subprocess_shell(command, stdout= subprocess.PIPE, stderr= subprocess.PIPE, start_new_session= True)
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            await self.__kill(process)
+            raise subprocess.TimeoutExpired(command, timeout)
+        except asyncio.CancelledError:
+            await self.__kill(process)
+            raise
+        return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+
+    async def __kill(self, process):
+        # Kill the whole process group, the shell may have started the command as a child
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        await process.wait()
+
+    async def __bridged(self, command, timeout):
+        bridge = self.bridges.pop() if len(self.bridges) > 0 else InteropBridge(self.bridge.command)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, bridge.run, command, timeout)
+        except asyncio.CancelledError:
+            # Stops the helper, which also ends the blocked read in the worker thread
+            bridge.close()
+            raise
+        finally:
+            self.bridges.append(bridge)
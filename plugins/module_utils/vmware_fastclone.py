@@ -0,0 +1,231 @@
+import asyncio, errno, fcntl, os, re, secrets, shutil
+
+try:
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_vmdk import SECTOR, Vmdk
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_vmx import VmxDocument
+except:
+    from module_utils.vmware_vmdk import SECTOR, Vmdk
+    from module_utils.vmware_vmx import VmxDocument
+
+# ioctl sharing the extents of a file on filesystems with reflinks, like XFS and Btrfs
+FICLONE = 0x40049409
+CHUNK = 64 * 1024 * 1024
+# Larger vmdk files without sparse header are flat extents, not text descriptors
+DESCRIPTOR = 1024 * 1024
+
+def segments(fd, size):
+    """Yields the (start, end) ranges of a file that contain data, or the whole file when holes can't be detected"""
+    if hasattr(os, 'SEEK_DATA') == False:
+        yield 0, size
+        return
+    position = 0
+    while position < size:
+        try:
+            start = os.lseek(fd, position, os.SEEK_DATA)
+            end = os.lseek(fd, start, os.SEEK_HOLE)
+        except OSError as e:
+            if e.errno == errno.ENXIO:
+                # Only a hole is left
+                return
+            start, end = position, size
+        yield start, min(end, size)
+        position = end
+
+def copyfile(source, target):
+    """Copies a file with a reflink when the filesystem supports it, otherwise only its data segments
+    with copy_file_range, or read and write when that isn't available either. Holes stay holes.
+    Returns the method used and the number of bytes copied."""
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return 'reflink', 0
+        except OSError:
+            pass
+
+        size = os.fstat(src.fileno()).st_size
+        method = 'copy_file_range' if hasattr(os, 'copy_file_range') else 'copy'
+        copied = 0
+        for start, end in segments(src.fileno(), size):
+            position = start
+            while position < end:
+                count = min(end - position, CHUNK)
+                if method == 'copy_file_range':
+                    try:
+                        written = os.copy_file_range(src.fileno(), dst.fileno(), count, position, position)
+                    except OSError:
+                        # For example across filesystems on older kernels, continue with plain copies
+                        method = 'copy'
+                        continue
+                else:
+                    data = os.pread(src.fileno(), count, position)
+                    written = os.pwrite(dst.fileno(), data, position) if data != b'' else 0
+                if written == 0:
+                    break
+                position += written
+                copied += written
+        os.ftruncate(dst.fileno(), size)
+        return method, copied
+
+class FastClone:
+    """Full clone of a stopped virtual machine, made by copying the files of its folder in parallel.
+    The clone gets a new vmx with a new uuid.bios, new MAC addresses and its own displayName,
+    and is registered in the inventory. Logs, lock and suspend files are not copied, the snapshots
+    are copied with their memory files so the clone can revert to them.
+    Absolute paths into the template folder, in the vmx and in the disk descriptors, are moved to the clone folder."""
+
+    SKIP = re.compile(r'(\.log|\.scoreboard|\.lck|\.vmx|~)$', re.IGNORECASE)
+    # Memory of the running or suspended VM, the memory files of snapshots like vm-Snapshot1.vmem are copied
+    SUSPEND = re.compile(r'\.(vmss|vmem)$', re.IGNORECASE)
+    SNAPSHOT = re.compile(r'-Snapshot\d+\.vmem$', re.IGNORECASE)
+    REMOVE = ('uuid.location', 'vc.uuid', 'sched.swap.derivedName', 'migrate.hostLog')
+
+    def __init__(self, template, targetname) -> None:
+        self.template = template
+        self.targetname = targetname
+        self.host = template.host
+
+    async def run(self):
+        """Clones the template and returns the copied files, the new vmx and its identifiers"""
+        template = self.template
+        if template.exists() == False:
+            raise ValueError("Template VM does not exist")
+        state = await self.host.executor.thread(template.getPowerState)
+        if state != 'stopped':
+            raise ValueError("Template VM must be stopped for a fast clone, it is {}".format(state))
+
+        source = os.path.dirname(template.tolocalpath(template.vmpath))
+        targetvmx = template.getClonePath(self.targetname)
+        target = os.path.dirname(template.tolocalpath(targetvmx))
+        self.folder = re.split(r'[\\/][^\\/]*$', template.vmpath)[0]
+        self.targetfolder = re.split(r'[\\/][^\\/]*$', targetvmx)[0]
+        await self.host.executor.thread(self.__checkDisks)
+        files = sorted((entry for entry in os.scandir(source) if entry.is_file() and self.__copied(entry.name)), key= lambda entry: entry.stat().st_size, reverse= True)
+
+        os.makedirs(target)
+        try:
+            # All copies have ended before a failure removes the target folder
+            copies = await asyncio.gather(*[self.host.executor.thread(copyfile, entry.path, os.path.join(target, entry.name)) for entry in files], return_exceptions= True)
+            for copy in copies:
+                if isinstance(copy, BaseException):
+                    raise copy
+            for entry in files:
+                if entry.name.casefold().endswith('.vmdk'):
+                    await self.host.executor.thread(self.__descriptor, os.path.join(target, entry.name))
+            result = self.__vmx(os.path.join(target, os.path.basename(template.tolocalpath(targetvmx))))
+            await self.host.executor.thread(template.registerVm, targetvmx, self.targetname)
+        except BaseException:
+            shutil.rmtree(target, ignore_errors= True)
+            raise
+
+        result['vmx'] = targetvmx
+        result['files'] = [dict(name= entry.name, bytes= entry.stat().st_size, method= method, copied= copied) for entry, (method, copied) in zip(files, copies)]
+        result['bytes'] = sum(file['bytes'] for file in result['files'])
+        result['copied'] = sum(file['copied'] for file in result['files'])
+        return result
+
+    def __copied(self, name):
+        if self.SKIP.search(name) != None:
+            return False
+        return self.SUSPEND.search(name) == None or self.SNAPSHOT.search(name) != None
+
+    def __checkDisks(self):
+        # A full clone must not depend on files outside of the template folder
+        folderpath = re.split(r'[\\/][^\\/]*$', self.template.vmpath)[0]
+        folder = folderpath.casefold()
+        for device, keys in self.template.getDevices().items():
+            filename = keys.get('fileName', '')
+            if filename.casefold().endswith('.vmdk') == False or keys.get('present', 'TRUE').upper() == 'FALSE':
+                continue
+            if re.match(r'^([a-z]:|[\\/])', filename, re.IGNORECASE) == None:
+                filename = folderpath + ('\\' if '\\' in self.template.vmpath else '/') + filename
+            vmdk = Vmdk.read(filename, self.template.tolocalpath)
+            paths = [vmdk.extentpath(extent['file']) for extent in vmdk.extents if extent['file'] != None] + [parent.get('path', '') for parent in vmdk.chain()]
+            for path in [filename] + paths:
+                if re.split(r'[\\/][^\\/]*$', path)[0].casefold() != folder:
+                    raise ValueError("Disk {0} of {1} uses {2}, which is outside of the template folder".format(device, self.template.name, path))
+
+    def __relocate(self, path):
+        # Absolute path of a file of the template folder, moved to the clone folder
+        if re.match(r'^([a-z]:|[\\/])', path, re.IGNORECASE) == None:
+            return path
+        match = re.match(r'^(.*)([\\/][^\\/]*)$', path)
+        if match == None or match.group(1).casefold() != self.folder.casefold():
+            return path
+        return self.targetfolder + match.group(2)
+
+    def __descriptor(self, localpath):
+        # Rewrites the extent and parent file names of a copied descriptor, a text file or embedded in a sparse extent
+        with open(localpath, 'r+b') as content:
+            header = Vmdk.header(content.read(SECTOR))
+            if header != None:
+                if header['descriptorOffset'] == 0:
+                    return
+                position = header['descriptorOffset'] * SECTOR
+                size = header['descriptorSize'] * SECTOR
+            else:
+                position = 0
+                size = os.fstat(content.fileno()).st_size
+                if size > DESCRIPTOR:
+                    # A flat extent
+                    return
+            content.seek(position)
+            data = content.read(size).split(b'\0', 1)[0]
+            text = data.decode('utf-8', errors= 'surrogateescape')
+            if header == None and '# Disk DescriptorFile' not in text and 'createType' not in text:
+                return
+
+            def quoted(match):
+                return match.group(1) + '"' + self.__relocate(match.group(2)) + '"'
+            lines = []
+            for line in text.splitlines(True):
+                if Vmdk.EXTENT.match(line.strip()) != None:
+                    line = re.sub(r'^(\s*\S+\s+\d+\s+\w+\s+)"(.*)"', quoted, line)
+                else:
+                    line = re.sub(r'^(\s*parentFileNameHint\s*=\s*)"(.*)"', quoted, line)
+                lines.append(line)
+            rewritten = ''.join(lines).encode('utf-8', errors= 'surrogateescape')
+            if rewritten == data:
+                return
+            if len(rewritten) > size:
+                raise ValueError("The descriptor of {} is too small for the paths of the clone".format(os.path.basename(localpath)))
+            content.seek(position)
+            if header != None:
+                # The embedded descriptor keeps its size, the rest of it is zeroed
+                content.write(rewritten.ljust(size, b'\0'))
+            else:
+                content.write(rewritten)
+                content.truncate()
+
+    def __vmx(self, path):
+        templatevmx = self.template.tolocalpath(self.template.vmpath)
+        document = VmxDocument.read(templatevmx)
+        uuid = secrets.token_bytes(16)
+        document.set('displayName', self.targetname)
+        document.set('uuid.bios', ' '.join('{:02x}'.format(value) for value in uuid[:8]) + '-' + ' '.join('{:02x}'.format(value) for value in uuid[8:]))
+        # Keep the new uuid.bios instead of asking whether the VM was moved or copied
+        document.set('uuid.action', 'keep')
+        for key in self.REMOVE:
+            document.remove(key)
+        if document.get('checkpoint.vmState') != None:
+            document.set('checkpoint.vmState', '')
+        for key in document.keys():
+            document.set(key, self.__relocate(document.get(key)))
+
+        macs = dict()
+        for adapter in [key[:-len('.present')] for key in document.keys() if re.match(r'^ethernet\d+\.present$', key, re.IGNORECASE)]:
+            if document.get(adapter + '.addressType', 'generated').casefold() == 'static':
+                # Static addresses must stay in the range reserved for manually assigned addresses
+                address = '00:50:56:{:02x}:{:02x}:{:02x}'.format(secrets.randbelow(0x40), secrets.randbelow(0x100), secrets.randbelow(0x100))
+                document.set(adapter + '.address', address)
+            else:
+                # Generated addresses are derived from the last bytes of uuid.bios, like VMware does
+                offset = int(document.get(adapter + '.generatedAddressOffset', '0') or 0)
+                value = (int.from_bytes(uuid[13:], 'big') + offset) & 0xffffff
+                address = '00:0c:29:{:02x}:{:02x}:{:02x}'.format(value >> 16, (value >> 8) & 0xff, value & 0xff)
+                document.set(adapter + '.addressType', 'generated')
+                document.set(adapter + '.generatedAddress', address)
+            macs[adapter] = address
+
+        document.write(path)
+        shutil.copymode(templatevmx, path)
+        return dict(uuid= document.get('uuid.bios'), macs= macs)
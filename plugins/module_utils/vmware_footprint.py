@@ -0,0 +1,161 @@
+import os, re, threading
+
+try:
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_cache import FileCache
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_vmdk import Vmdk
+except:
+    from module_utils.vmware_cache import FileCache
+    from module_utils.vmware_vmdk import Vmdk
+
+class Footprint:
+    """Disk space used by virtual machines, by category of file.
+    Disks of linked clones are attributed to the parent disks they share, which are counted once per report.
+    File sizes are read on every scan, the classification of the files of a VM folder is cached until the modification time of the folder changes."""
+
+    CATEGORIES = ('base', 'snapshot', 'memory', 'logs', 'other')
+
+    EXTENT = re.compile(r'-(s\d{3}|f\d{3}|flat)\.vmdk$', re.IGNORECASE)
+    DELTA = re.compile(r'-\d{6}(-(s\d{3}|f\d{3}|flat))?\.vmdk$', re.IGNORECASE)
+    SNAPSHOT = re.compile(r'(\.vmsn|-snapshot\d+\.vmem)$', re.IGNORECASE)
+    MEMORY = re.compile(r'\.(vmss|vmem)$', re.IGNORECASE)
+    LOGS = re.compile(r'(\.log|\.scoreboard)$', re.IGNORECASE)
+
+    def __init__(self, vmware, refresh= False) -> None:
+        self.vmware = vmware
+        self.cache = FileCache('footprint', int(os.environ.get('VMWARE_WPRO_CACHE_TTL', 86400)))
+        self.directories = dict() if refresh else (self.cache.load() or dict())
+        self.changed = False
+        self.lock = threading.Lock()
+
+    def save(self):
+        if self.changed:
+            self.cache.save(self.directories)
+
+    # Folder scan
+
+    def directory(self, path):
+        """Returns the files of a folder of the VMware host with their size, category and disk, and the parent disks outside of it.
+        The sizes are read on every call, files grow without changing the folder."""
+        localpath = self.vmware.tolocalpath(path)
+        key = os.stat(localpath).st_mtime_ns
+        files = self.__files(localpath)
+        with self.lock:
+            cached = self.directories.get(path.casefold())
+        if cached == None or cached['key'] != key or 'owners' not in cached:
+            cached = self.__classify(path, files, key)
+            with self.lock:
+                self.directories[path.casefold()] = cached
+                self.changed = True
+
+        for file in files:
+            owner = cached['owners'].get(file['name'].casefold())
+            if owner != None:
+                disk, file['category'] = owner
+                if disk != None:
+                    file['disk'] = disk
+            else:
+                # Created in a subfolder, which doesn't change the modification time of the folder
+                file['category'] = self.__category(file['name'])
+        return dict(files= files, parents= cached['parents'])
+
+    def __classify(self, path, files, key):
+        # Category and disk by file name, from the descriptors of the folder
+        separator = '\\' if '\\' in path else '/'
+        disks = dict()
+        for file in files:
+            if file['name'].casefold().endswith('.vmdk') and self.EXTENT.search(file['name']) == None:
+                try:
+                    disks[file['name']] = Vmdk.read(path + separator + file['name'], self.vmware.tolocalpath)
+                except (OSError, ValueError):
+                    pass
+
+        result = dict(key= key, owners= dict(), parents= [])
+        for name, vmdk in disks.items():
+            parents = [parent['path'] for parent in vmdk.chain() if 'error' not in parent]
+            external = [parent for parent in parents if self.__inside(path, parent) == False]
+            # A snapshot delta has its parent in the same folder, a linked clone disk in the folder of the template
+            category = 'snapshot' if len(parents) > 0 and self.__inside(path, parents[0]) else 'base'
+            result['owners'][name.casefold()] = (name, category)
+            for extent in vmdk.extents:
+                if extent['file'] != None:
+                    result['owners'].setdefault(re.split(r'[\\/]', extent['file'])[-1].casefold(), (name, category))
+            for parent in external:
+                if parent.casefold() not in [known.casefold() for known in result['parents']]:
+                    result['parents'].append(parent)
+
+        for file in files:
+            if file['name'].casefold() not in result['owners']:
+                result['owners'][file['name'].casefold()] = (None, self.__category(file['name']))
+        return result
+
+    def __files(self, localpath):
+        result = []
+        folders = [('', localpath)]
+        while len(folders) > 0:
+            prefix, folder = folders.pop()
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks= False):
+                        folders.append((prefix + entry.name + '/', entry.path))
+                    elif entry.is_file(follow_symlinks= False):
+                        result.append(dict(name= prefix + entry.name, size= entry.stat(follow_symlinks= False).st_size))
+        return result
+
+    def __category(self, name):
+        if '/' in name:
+            return 'other'
+        if name.casefold().endswith('.vmdk'):
+            return 'snapshot' if self.DELTA.search(name) != None else 'base'
+        if self.SNAPSHOT.search(name) != None:
+            return 'snapshot'
+        if self.MEMORY.search(name) != None:
+            return 'memory'
+        if self.LOGS.search(name) != None:
+            return 'logs'
+        return 'other'
+
+    def __inside(self, folder, path):
+        return re.split(r'[\\/][^\\/]*$', path)[0].casefold() == folder.casefold()
+
+    # Accounting
+
+    def vm(self, vmxpath):
+        """Returns the bytes used by the folder of a VM by category, and the parent disks it shares"""
+        folder = re.split(r'[\\/][^\\/]*$', vmxpath)[0]
+        scan = self.directory(folder)
+        categories = dict((category, 0) for category in self.CATEGORIES)
+        for file in scan['files']:
+            categories[file['category']] += file['size']
+        return dict(
+            directory= folder,
+            bytes= sum(categories.values()),
+            categories= categories,
+            shared= [dict(path= parent, bytes= self.disk(parent)) for parent in scan['parents']]
+        )
+
+    def disk(self, path):
+        """Returns the bytes of a disk and its extents, from the scan of its folder"""
+        folder, name = re.match(r'^(.*)[\\/]([^\\/]*)$', path).groups()
+        try:
+            scan = self.directory(folder)
+        except OSError:
+            return 0
+        return sum(file['size'] for file in scan['files'] if file.get('disk', '').casefold() == name.casefold())
+
+    def totals(self, vms):
+        """Sums the footprints of VMs, shared parent disks are counted once and only when their folder isn't part of the VMs"""
+        categories = dict((category, 0) for category in self.CATEGORIES)
+        for vm in vms:
+            for category, size in vm['categories'].items():
+                categories[category] += size
+        folders = set(vm['directory'].casefold() for vm in vms)
+        shared = dict()
+        for vm in vms:
+            for parent in vm['shared']:
+                if re.split(r'[\\/][^\\/]*$', parent['path'])[0].casefold() not in folders:
+                    shared[parent['path'].casefold()] = parent['bytes']
+        return dict(
+            bytes= sum(categories.values()) + sum(shared.values()),
+            categories= categories,
+            shared= sum(shared.values())
+        )
@@ -0,0 +1,91 @@
+import re
+
+class Inventory:
+    """Index of the virtual machines and folders registered in inventory.vmls.
+    Lookups by display name and by vmx basename are case-insensitive."""
+
+    def __init__(self, vms, folders, paths) -> None:
+        self.vms = vms
+        self.folders = folders
+        self.paths = paths
+        self.bybasename = dict()
+        self.bydisplayname = dict()
+        for vm in vms:
+            self.bybasename.setdefault(vm['name'].casefold(), vm)
+            self.bydisplayname.setdefault(vm['displayName'].casefold(), vm)
+
+    @staticmethod
+    def parse(inventory):
+        """Builds the index from the key/values of inventory.vmls"""
+        entries = dict()
+        paths = []
+        for key, value in inventory.items():
+            match = re.match(r'(vmlist\d+)\.(.*)', key)
+            if match != None:
+                entries.setdefault(match.group(1), dict(id= match.group(1)))[match.group(2)] = value
+            elif value.casefold().endswith('.vmx'):
+                # Other references to vmx files, like the most recently used list
+                paths.append(value)
+
+        vms = []
+        folders = dict()
+        for entry in entries.values():
+            config = entry.get('config', '')
+            if entry.get('Type') == '2' or config.startswith('folder'):
+                folders[entry.get('ItemID', entry['id'])] = dict(id= entry['id'], displayName= entry.get('DisplayName', ''), parent= entry.get('ParentID', '0'))
+            elif config.casefold().endswith('.vmx'):
+                name = re.split(r'[\\/]', config)[-1][:-len('.vmx')]
+                vms.append(dict(id= entry['id'], name= name, config= config, displayName= entry.get('DisplayName', name), parent= entry.get('ParentID', '0')))
+                paths.append(config)
+        return Inventory(vms, folders, paths)
+
+    def todict(self):
+        return dict(vms= self.vms, folders= self.folders, paths= self.paths)
+
+    @staticmethod
+    def fromdict(data):
+        return Inventory(data['vms'], data['folders'], data['paths'])
+
+    def hostnames(self):
+        """Returns the VM entries by a unique name: the vmx basename, or when several VMs share it
+        the display name, or the basename with the entry id when the display name isn't unique either"""
+        basenames = dict()
+        for vm in self.vms:
+            basenames[vm['name'].casefold()] = basenames.get(vm['name'].casefold(), 0) + 1
+        displaynames = dict()
+        for vm in self.vms:
+            displaynames[vm['displayName'].casefold()] = displaynames.get(vm['displayName'].casefold(), 0) + 1
+
+        result = dict()
+        for vm in self.vms:
+            name = vm['name']
+            if basenames[name.casefold()] > 1:
+                name = vm['displayName']
+                if displaynames[name.casefold()] > 1 or name.casefold() in basenames or name == '':
+                    name = '{0}_{1}'.format(vm['name'], vm['id'])
+            result[name] = vm
+        return result
+
+    def find(self, name):
+        """Returns the VM entry by vmx basename or display name, exact matches only"""
+        name = name.casefold()
+        if name in self.bybasename:
+            return self.bybasename[name]
+        return self.bydisplayname.get(name)
+
+    def search(self, vmxfile):
+        """Returns the first registered vmx path containing vmxfile, or None"""
+        vmxfile = vmxfile.casefold()
+        for path in self.paths:
+            if vmxfile in path.casefold():
+                return path
+        return None
+
+    def folder(self, vm):
+        """Returns the folder path of a VM entry, like Lab/Web"""
+        names = []
+        parent = vm['parent']
+        while parent in self.folders and len(names) < len(self.folders):
+            names.insert(0, self.folders[parent]['displayName'])
+            parent = self.folders[parent]['parent']
+        return '/'.join(names)
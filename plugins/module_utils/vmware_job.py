@@ -0,0 +1,194 @@
+import fcntl, hashlib, json, os, re, signal, subprocess, sys, tempfile, time, traceback
+
+try:
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_cache import cachedir
+except:
+    from module_utils.vmware_cache import cachedir
+
+def detach(function, *args, logpath= None):
+    """Runs function(*args) in a daemon process and returns its pid.
+    The daemon has its own session, so it keeps running after the module has returned.
+    Its output and any exception are written to logpath."""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid != 0:
+        os.close(write)
+        with os.fdopen(read, 'r') as pipe:
+            daemon = pipe.read()
+        os.waitpid(pid, 0)
+        return int(daemon)
+
+    os.close(read)
+    os.setsid()
+    daemon = os.fork()
+    if daemon != 0:
+        os.write(write, str(daemon).encode())
+        os._exit(0)
+    os.close(write)
+
+    status = 0
+    try:
+        null = os.open(os.devnull, os.O_RDONLY)
+        log = os.open(logpath if logpath != None else os.devnull, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        os.dup2(null, 0)
+        os.dup2(log, 1)
+        os.dup2(log, 2)
+        function(*args)
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        # Skip the atexit handlers and buffers inherited from the module process
+        os._exit(status)
+
+class Job:
+    """Background operation of a long running command, like shrinking a virtual disk.
+    Its state is a JSON file in the jobs folder of the cache directory, with the output of the command in a log file next to it.
+    At most limit jobs of the same kind run at the same time, the others wait in the queued state."""
+
+    FINAL = ('finished', 'failed', 'cancelled')
+
+    def __init__(self, kind, name) -> None:
+        self.kind = kind
+        self.name = name
+        self.id = '{0}-{1}'.format(kind, hashlib.sha1(name.casefold().encode()).hexdigest()[:16])
+        self.directory = os.path.join(cachedir(), 'jobs')
+        self.path = os.path.join(self.directory, self.id + '.json')
+        self.logpath = os.path.join(self.directory, self.id + '.log')
+
+    def load(self):
+        """Returns the job state, or None when the job never ran"""
+        try:
+            with open(self.path, 'r') as content:
+                state = json.load(content)
+        except (OSError, ValueError):
+            return None
+        if state['status'] not in self.FINAL and state.get('pid') != None and self.__alive(state['pid']) == False:
+            state.update(status= 'failed', msg= 'Job process ended unexpectedly')
+            self.__save(state)
+        state['output'] = self.__tail()
+        return state
+
+    def running(self):
+        state = self.load()
+        return state != None and state['status'] not in self.FINAL
+
+    def start(self, command, limit= 1, pattern= r'(\d+)% done', **info):
+        """Runs the command in a daemon process and returns the initial job state"""
+        os.makedirs(self.directory, exist_ok= True)
+        state = dict(id= self.id, name= self.name, status= 'queued', progress= 0, pid= None, rc= None, started= time.time(), finished= None, log= self.logpath, **info)
+        with open(self.logpath, 'w'):
+            pass
+        self.__save(state)
+        state['pid'] = detach(self.__run, state, command, limit, pattern, logpath= self.logpath)
+        return state
+
+    def cancel(self, timeout= 30):
+        """Stops a queued or running job and waits until it has ended, returns the job state"""
+        state = self.load()
+        if state == None or state['status'] in self.FINAL:
+            return state
+        try:
+            os.kill(state['pid'], signal.SIGTERM)
+        except (OSError, TypeError):
+            pass
+        deadline = time.monotonic() + timeout
+        while state['status'] not in self.FINAL and time.monotonic() < deadline:
+            time.sleep(0.2)
+            state = self.load()
+        return state
+
+    # Daemon process
+
+    def __run(self, state, command, limit, pattern):
+        state['pid'] = os.getpid()
+        self.__save(state)
+        cancelled = []
+        process = []
+
+        def stop(signum, frame):
+            cancelled.append(signum)
+            for running in process:
+                try:
+                    os.killpg(running.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+        signal.signal(signal.SIGTERM, stop)
+
+        slot = self.__slot(limit, cancelled)
+        if slot != None:
+            state['status'] = 'running'
+            self.__save(state)
+            process.append(subprocess.Popen(command, shell= True, stdout= subprocess.PIPE, stderr= subprocess.STDOUT, start_new_session= True))
+            if len(cancelled) > 0:
+                stop(signal.SIGTERM, None)
+            self.__follow(state, process[0], re.compile(pattern))
+            state['rc'] = process[0].wait()
+            slot.close()
+
+        if len(cancelled) > 0:
+            state['status'] = 'cancelled'
+        else:
+            state['status'] = 'finished' if state['rc'] == 0 else 'failed'
+            if state['status'] == 'finished':
+                state['progress'] = 100
+        state['finished'] = time.time()
+        self.__save(state)
+
+    def __slot(self, limit, cancelled):
+        """Returns the open lock file of a free slot, or None when the job was cancelled while queued"""
+        while len(cancelled) == 0:
+            for number in range(max(1, limit)):
+                slot = open(os.path.join(self.directory, '{0}-slot-{1}.lock'.format(self.kind, number)), 'a')
+                try:
+                    fcntl.flock(slot, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return slot
+                except BlockingIOError:
+                    slot.close()
+            time.sleep(1)
+        return None
+
+    def __follow(self, state, process, pattern):
+        # Copies the output to the log and saves the progress whenever the percentage changes
+        fd = process.stdout.fileno()
+        while True:
+            try:
+                data = os.read(fd, 65536)
+            except InterruptedError:
+                continue
+            if data == b'':
+                break
+            os.write(1, data)
+            percentages = pattern.findall(data.decode(errors= 'replace'))
+            if len(percentages) > 0 and int(percentages[-1]) != state['progress']:
+                state['progress'] = int(percentages[-1])
+                self.__save(state)
+
+    # Helpers
+
+    def __save(self, state):
+        fd, tmppath = tempfile.mkstemp(dir= self.directory, prefix= '.tmp')
+        with os.fdopen(fd, 'w') as content:
+            json.dump(dict((k, v) for k, v in state.items() if k != 'output'), content)
+        os.replace(tmppath, self.path)
+
+    def __tail(self, size= 2048):
+        try:
+            with open(self.logpath, 'rb') as log:
+                log.seek(max(0, os.fstat(log.fileno()).st_size - size))
+                return log.read().decode(errors= 'replace').replace('\r', '\n').strip('\n').split('\n')[-1]
+        except OSError:
+            return ''
+
+    def __alive(self, pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            pass
+        return True
@@ -0,0 +1,151 @@
+import asyncio, json, os, secrets, tempfile, time
+
+try:
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_cache import cachedir, lockfile
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_vm import VM
+except:
+    from module_utils.vmware_cache import cachedir, lockfile
+    from module_utils.vmware_vm import VM
+
+class Pool:
+    """Linked clones of a template snapshot, created ahead of time and handed out on request.
+    Every member has a state file in the ready or claimed folder of the pool,
+    a member is claimed atomically by renaming its state file from ready to claimed.
+    A member that can't be booted or handed out is deleted, or kept in the failed folder when that fails too."""
+
+    def __init__(self, name, template, snapshot= '', size= 1, suspend= True, warmup= 0, host= None) -> None:
+        self.name = name
+        self.template = template
+        self.snapshot = snapshot
+        self.size = size
+        self.suspend = suspend
+        self.warmup = warmup
+        self.host = host
+        self.directory = os.path.join(os.environ.get('VMWARE_WPRO_POOL_DIR', os.path.join(cachedir(), 'pools')), name)
+        for state in ('ready', 'claimed', 'failed'):
+            os.makedirs(os.path.join(self.directory, state), exist_ok= True)
+
+    def members(self, state= 'ready'):
+        """Returns the members in the given state, oldest first"""
+        result = []
+        folder = os.path.join(self.directory, state)
+        for entry in os.scandir(folder):
+            if entry.name.startswith('.') == False:
+                try:
+                    with open(entry.path, 'r') as content:
+                        result.append(json.load(content))
+                except (OSError, ValueError):
+                    pass
+        return sorted(result, key= lambda member: member['created'])
+
+    def status(self):
+        return dict(
+            pool= self.name,
+            size= self.size,
+            ready= [member['name'] for member in self.members('ready')],
+            claimed= [member['name'] for member in self.members('claimed')],
+            failed= [member['name'] for member in self.members('failed')]
+        )
+
+    # Hand-out
+
+    async def claim(self, name):
+        """Hands out a ready member as the VM name: it is renamed, registered and started, which resumes a suspended member.
+        Returns None when the pool is empty."""
+        member = self.__take()
+        if member == None:
+            return None
+
+        started = time.monotonic()
+        vm = VM.fromPath(member['name'], member['vmx'], self.host)
+        result = dict(name= name, member= member['name'], vmx= member['vmx'], changed= True)
+        try:
+            await self.host.executor.thread(vm.setVmxConfig, dict(displayName= name))
+            await self.host.executor.thread(vm.registerVm, member['vmx'], name)
+            msg = await vm.executeAsync('start', 'nogui')
+        except Exception as e:
+            msg = 'Error: {}'.format(e)
+        if 'Error' in msg:
+            result['failed'] = True
+            result['msg'] = msg
+            result['discarded'] = await self.__discard(vm, member, msg)
+            os.remove(os.path.join(self.directory, 'claimed', member['name']))
+            return result
+
+        os.remove(os.path.join(self.directory, 'claimed', member['name']))
+        result['elapsed'] = round(time.monotonic() - started, 2)
+        return result
+
+    async def __discard(self, vm, member, msg):
+        # A member that failed to be created or handed out is never handed out, it is deleted or kept as failed
+        await vm.executeAsync('stop', 'hard')
+        deleted = await vm.executeAsync('deleteVM')
+        # The claimed name must not resolve to the discarded member
+        await self.host.executor.thread(vm.unregisterVm, member['vmx'])
+        if 'Error' in deleted:
+            member['msg'] = msg
+            self.__save('failed', member)
+        return 'Error' not in deleted
+
+    def __take(self):
+        for member in self.members('ready'):
+            try:
+                os.rename(os.path.join(self.directory, 'ready', member['name']), os.path.join(self.directory, 'claimed', member['name']))
+            except FileNotFoundError:
+                # Claimed by another process in the meantime
+                continue
+            return member
+        return None
+
+    # Replenishment
+
+    def replenish(self):
+        """Creates members until the pool has size ready members, returns their results.
+        Only one process replenishes a pool at a time, the others return an empty list."""
+        with lockfile(os.path.join(self.directory, 'replenish.lock'), blocking= False) as locked:
+            if locked == False:
+                return []
+            missing = self.size - len(self.members('ready'))
+            if missing <= 0:
+                return []
+            template = VM(self.template, self.host)
+            if template.exists() == False:
+                raise Exception("Template VM {} not found".format(self.template))
+            names = ['{0}-{1}'.format(self.name, secrets.token_hex(4)) for number in range(missing)]
+            results = self.host.executor.gather(*[self.__create(template, name) for name in names])
+            return [dict(name= name, changed= False, failed= True, msg= str(result)) if isinstance(result, Exception) else result for name, result in zip(names, results)]
+
+    async def __create(self, template, name):
+        started = time.monotonic()
+        result = dict(name= name, changed= False)
+        msg = (await template.cloneToAsync(targetname= name, option= 'linked', snapshot= self.snapshot)).strip('\r\n')
+        if msg != '':
+            result['failed'] = True
+            result['msg'] = msg
+            return result
+        result['changed'] = True
+
+        vm = VM.fromPath(name, template.getClonePath(name), self.host)
+        member = dict(name= name, vmx= vm.vmpath, template= self.template, snapshot= self.snapshot, suspended= self.suspend, created= time.time())
+        if self.suspend:
+            # Boot once and suspend, so a hand-out only needs to resume the VM
+            for command, parameter in (('start', 'nogui'), ('suspend', 'soft')):
+                msg = await vm.executeAsync(command, parameter)
+                if 'Error' in msg:
+                    result['failed'] = True
+                    result['msg'] = msg
+                    result['discarded'] = await self.__discard(vm, member, msg)
+                    return result
+                if command == 'start' and self.warmup > 0:
+                    await asyncio.sleep(self.warmup)
+
+        self.__save('ready', member)
+        result['elapsed'] = round(time.monotonic() - started, 2)
+        return result
+
+    def __save(self, state, member):
+        # The state file only appears once it is complete, a partial member is never handed out
+        fd, tmppath = tempfile.mkstemp(dir= self.directory, prefix= '.tmp')
+        with os.fdopen(fd, 'w') as content:
+            json.dump(member, content)
+        os.replace(tmppath, os.path.join(self.directory, state, member['name']))
@@ -0,0 +1,56 @@
+import os, re
+
+# Pause and unpause state changes logged by the vmx thread in vmware.log, from vmrun and from the user interface, like
+# 2023-05-01T10:00:00.000Z| vmx| I005: Vix: [vmxCommands.c:1234]: VMAutomation_Pause
+# 2024-06-01T10:00:00.000Z In(05) vmx - VMX_Unpause
+# Other lines mentioning a pause, for example of the guest or of a device, are ignored
+PAUSE_EVENT = re.compile(r'^\S+(?:\|\s*vmx\|\s*(?:[A-Z]\d+:\s*)?|\s+\w+\(\d+\)\s+vmx\s+-\s+).*\b(?:VMAutomation|VMX)_(Un)?[Pp]ause\b', re.MULTILINE)
+
+class PowerState:
+    """Determines the power state of virtual machines from host side signals only:
+    the vmrun list output, the .vmx.lck lock directory, .vmss suspend files and the tail of vmware.log"""
+
+    def __init__(self, vmware, logtail= 65536) -> None:
+        self.vmware = vmware
+        self.logtail = logtail
+
+    def state(self, vm):
+        """Returns stopped, started, paused or suspended"""
+        return self.evaluate([vm])[vm.name]
+
+    def evaluate(self, vms):
+        """Returns the power state of every VM by name, using a single vmrun list"""
+        running = set(value.casefold() for value in self.vmware.getRunningvms().values())
+        result = dict()
+        for vm in vms:
+            result[vm.name] = self.__evaluate(vm, running)
+        return result
+
+    def __evaluate(self, vm, running):
+        if vm.getPath() == '':
+            return 'stopped'
+        vmx = self.vmware.tolocalpath(vm.getPath())
+        vmdir = os.path.dirname(vmx)
+        try:
+            entries = set(entry.name.casefold() for entry in os.scandir(vmdir))
+        except OSError:
+            entries = set()
+        base = os.path.basename(vmx).casefold()
+
+        # A lock without vmrun list entry belongs to a VM powered on by another session
+        if vm.getPath().casefold() in running or base + '.lck' in entries:
+            return 'paused' if 'vmware.log' in entries and self.__paused(os.path.join(vmdir, 'vmware.log')) else 'started'
+        if base[:-len('.vmx')] + '.vmss' in entries:
+            return 'suspended'
+        return 'stopped'
+
+    def __paused(self, logfile):
+        """Returns true when the last pause event in the log is a pause"""
+        try:
+            with open(logfile, 'rb') as log:
+                log.seek(max(0, os.path.getsize(logfile) - self.logtail))
+                tail = log.read().decode(errors= 'replace')
+        except OSError:
+            return False
+        events = PAUSE_EVENT.findall(tail)
+        return len(events) > 0 and events[-1] == ''
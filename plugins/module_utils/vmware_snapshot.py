@@ -0,0 +1,204 @@
+import asyncio, fnmatch, re, time
+from datetime import datetime, timedelta, timezone
+
+class SnapshotTree:
+    """Snapshots of a virtual machine as read from its .vmsd file, without running vmrun"""
+
+    def __init__(self, snapshots, current= None) -> None:
+        self.snapshots = snapshots
+        self.current = current
+        self.byuid = dict((snapshot['uid'], snapshot) for snapshot in snapshots)
+        for snapshot in snapshots:
+            snapshot['children'] = [child['uid'] for child in snapshots if child['parent'] == snapshot['uid']]
+            snapshot['current'] = snapshot['uid'] == current
+
+    @staticmethod
+    def parse(vmsd):
+        """Builds the tree from the key/values of a .vmsd file"""
+        entries = dict()
+        for key, value in vmsd.items():
+            match = re.match(r'^snapshot(\d+)\.(.+)$', key)
+            if match != None:
+                entries.setdefault(int(match.group(1)), dict())[match.group(2)] = value
+
+        snapshots = []
+        for number in sorted(entries.keys()):
+            entry = entries[number]
+            if 'uid' not in entry:
+                continue
+            disks = []
+            for disk in range(int(entry.get('numDisks', 0))):
+                disks.append(dict(
+                    node= entry.get('disk{}.node'.format(disk), ''),
+                    fileName= entry.get('disk{}.fileName'.format(disk), '')
+                ))
+            snapshots.append(dict(
+                uid= entry['uid'],
+                name= entry.get('displayName', ''),
+                description= entry.get('description', ''),
+                parent= entry.get('parent'),
+                createTime= SnapshotTree.createTime(entry.get('createTimeHigh', '0'), entry.get('createTimeLow', '0')),
+                filename= entry.get('filename', ''),
+                disks= disks
+            ))
+        return SnapshotTree(snapshots, vmsd.get('snapshot.current'))
+
+    @staticmethod
+    def createTime(high, low):
+        """Converts the 64 bit microsecond timestamp, stored as two signed 32 bit values, to ISO 8601"""
+        microseconds = (int(high) << 32) | (int(low) & 0xffffffff)
+        return datetime.fromtimestamp(microseconds / 1000000, timezone.utc).isoformat()
+
+    def names(self):
+        """Returns the snapshot names, parents before their children"""
+        return [snapshot['name'] for snapshot in self.walk()]
+
+    def find(self, name):
+        for snapshot in self.snapshots:
+            if snapshot['name'] == name:
+                return snapshot
+        return None
+
+    def roots(self):
+        return [snapshot for snapshot in self.snapshots if snapshot['parent'] not in self.byuid]
+
+    def walk(self):
+        """Yields the snapshots depth first"""
+        pending = list(reversed(self.roots()))
+        while len(pending) > 0:
+            snapshot = pending.pop()
+            yield snapshot
+            pending += reversed([self.byuid[uid] for uid in snapshot['children']])
+
+    def chain(self):
+        """Returns the uids from the current snapshot up to its root"""
+        result = []
+        uid = self.current
+        while uid in self.byuid and uid not in result:
+            result.append(uid)
+            uid = self.byuid[uid]['parent']
+        return result
+
+    def path(self, uid):
+        """Returns the path of a snapshot, like Base/Patched, which vmrun accepts for ambiguous names"""
+        names = []
+        while uid in self.byuid and len(names) < len(self.snapshots):
+            names.insert(0, self.byuid[uid]['name'])
+            uid = self.byuid[uid]['parent']
+        return '/'.join(names)
+
+    def retentionPlan(self, keep_newest= None, keep_pattern= None, older_than_days= None, sizeof= None, currentdisks= []):
+        """Returns the snapshots to delete in the order that minimizes consolidation.
+        Snapshots are kept when they are one of the keep_newest newest, match the glob keep_pattern
+        or are not older than older_than_days. Leaves outside of the current chain are deleted first,
+        the current chain last. sizeof returns the size in bytes of a disk file, to estimate the
+        size of the delta disks merged by every deletion."""
+        bytime = sorted(self.snapshots, key= lambda snapshot: snapshot['createTime'], reverse= True)
+        keep = set()
+        if keep_newest != None:
+            keep.update(snapshot['uid'] for snapshot in bytime[:keep_newest])
+        if keep_pattern != None:
+            keep.update(snapshot['uid'] for snapshot in self.snapshots if fnmatch.fnmatchcase(snapshot['name'], keep_pattern))
+        if older_than_days != None:
+            cutoff = datetime.now(timezone.utc) - timedelta(days= older_than_days)
+            keep.update(snapshot['uid'] for snapshot in self.snapshots if datetime.fromisoformat(snapshot['createTime']) > cutoff)
+
+        # Simulate the deletions on a copy of the parent/children relations
+        parents = dict((snapshot['uid'], snapshot['parent']) for snapshot in self.snapshots)
+        children = dict((snapshot['uid'], list(snapshot['children'])) for snapshot in self.snapshots)
+        chain = self.chain()
+        current = [self.current]
+        remaining = [snapshot['uid'] for snapshot in self.snapshots if snapshot['uid'] not in keep]
+
+        def estimate(uid):
+            # The delta disks written after the snapshot are merged when it is deleted
+            own = set(disk['fileName'] for disk in self.byuid[uid]['disks'])
+            deltas = set()
+            for child in children[uid]:
+                deltas.update(disk['fileName'] for disk in self.byuid[child]['disks'])
+            if uid == current[0]:
+                deltas.update(currentdisks)
+            deltas -= own
+            return sum(sizeof(disk) for disk in deltas) if sizeof != None else 0
+
+        def ancestors(uid):
+            result = []
+            while parents.get(uid) in parents and len(result) < len(parents):
+                uid = parents[uid]
+                result.append(uid)
+            return result
+
+        def depth(uid):
+            return len(ancestors(uid))
+
+        plan = []
+        while len(remaining) > 0:
+            uid = min(remaining, key= lambda uid: (uid in chain, len(children[uid]) > 0, -depth(uid), estimate(uid)))
+            plan.append(dict(
+                uid= uid,
+                name= self.byuid[uid]['name'],
+                path= '/'.join(self.byuid[ancestor]['name'] for ancestor in reversed([uid] + ancestors(uid))),
+                createTime= self.byuid[uid]['createTime'],
+                current= uid in chain,
+                estimatedMergeBytes= estimate(uid)
+            ))
+            remaining.remove(uid)
+            if uid == current[0]:
+                current[0] = parents[uid]
+            for child in children[uid]:
+                parents[child] = parents[uid]
+            if parents[uid] in children:
+                children[parents[uid]] = [c for c in children[parents[uid]] if c != uid] + children[uid]
+            del children[uid], parents[uid]
+        return plan
+
+    def totree(self):
+        """Returns the snapshots as nested dicts, children included in their parent"""
+        def node(snapshot):
+            result = dict((k, v) for k, v in snapshot.items() if k != 'children')
+            result['children'] = [node(self.byuid[uid]) for uid in snapshot['children']]
+            return result
+        return [node(snapshot) for snapshot in self.roots()]
+
+async def groupSnapshot(vms, name, states):
+    """Takes a crash consistent snapshot of a group of VMs.
+    All running VMs are paused first, then the snapshots are taken concurrently and every VM is
+    unpaused as soon as its own snapshot is done. states holds the power state of every VM by name.
+    Returns the result per VM, with the time it was paused in seconds."""
+    results = dict((vm.name, dict(name= vm.name, changed= False)) for vm in vms)
+    running = [vm for vm in vms if states[vm.name] == 'started']
+
+    async def pause(vm):
+        started = time.monotonic()
+        msg = await vm.executeAsync('pause')
+        return started, msg
+
+    paused = await asyncio.gather(*[pause(vm) for vm in running])
+    pausedat = dict((vm.name, started) for vm, (started, msg) in zip(running, paused) if 'Error' not in msg)
+    failed = [(vm, msg) for vm, (started, msg) in zip(running, paused) if 'Error' in msg]
+    if len(failed) > 0:
+        # Without all members paused the group snapshot is not consistent, so nothing is taken
+        await asyncio.gather(*[vm.executeAsync('unpause') for vm in running if vm.name in pausedat])
+        for vm, msg in failed:
+            results[vm.name].update(failed= True, msg= msg)
+        for vm in vms:
+            results[vm.name].setdefault('msg', 'Group snapshot cancelled, not all virtual machines could be paused')
+        return [results[vm.name] for vm in vms]
+
+    async def snapshot(vm):
+        started = time.monotonic()
+        msg = await vm.executeAsync('snapshot', '"{}"'.format(name))
+        results[vm.name]['elapsed'] = round(time.monotonic() - started, 2)
+        if vm.name in pausedat:
+            unpausemsg = await vm.executeAsync('unpause')
+            results[vm.name]['paused'] = round(time.monotonic() - pausedat[vm.name], 2)
+            if 'Error' in unpausemsg:
+                msg = (msg + ' ' + unpausemsg).strip()
+        results[vm.name]['msg'] = msg
+        if 'Error' in msg:
+            results[vm.name]['failed'] = True
+        else:
+            results[vm.name]['changed'] = True
+
+    await asyncio.gather(*[snapshot(vm) for vm in vms])
+    return [results[vm.name] for vm in vms]
@@ -1,14 +1,18 @@
-import os.path
+import os.path, re
 
 try:
     from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware import VMWare
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_job import Job
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_vmdk import Vmdk
 except:
     from module_utils.vmware import VMWare
+    from module_utils.vmware_job import Job
+    from module_utils.vmware_vmdk import Vmdk
 
 class VDisk(VMWare):
     
-    def __init__(self, vmdk) -> None:
-        super().__init__()
+    def __init__(self, vmdk, host= None) -> None:
+        super().__init__(host)
         self.vmdk = vmdk
 
     def exists(self):
@@ -16,9 +20,25 @@ class VDisk(VMWare):
         result = True if os.path.isfile(vmdk) else False
         return result;
 
+    def info(self, parents= True):
+        """Returns the facts read from the descriptor and extent headers, without running vmware-vdiskmanager"""
+        return Vmdk.read(self.vmdk, self.tolocalpath).facts(parents)
+
+    def estimate(self, scan= False):
+        """Returns the estimated gain of shrink and defragment, read from the grain tables of the sparse extents"""
+        return Vmdk.read(self.vmdk, self.tolocalpath).estimate(scan)
+
     def create(self, size, adaptertype= 'lsilogic', disktype= 0):
         result = self.vdiskmanager("-c -a {0} -s {1} -t {2} \"{3}\"".format(adaptertype, size, disktype, self.vmdk))
         return result
+
+    async def createAsync(self, size, adaptertype= 'lsilogic', disktype= 0):
+        return await self.vdiskmanagerAsync("-c -a {0} -s {1} -t {2} \"{3}\"".format(adaptertype, size, disktype, self.vmdk))
+
+    def getVolume(self):
+        """Returns the volume of the disk file, like c: or \\\\server\\share"""
+        match = re.match(r'^([a-z]:|[\\/]{2}[^\\/]+[\\/][^\\/]+)', self.vmdk, re.IGNORECASE)
+        return match.group(1).casefold().replace('/', '\\') if match != None else ''
     
     def shrink(self):
         result = self.vdiskmanager("-k \"{0}\"".format(self.vmdk))
@@ -28,5 +48,20 @@ class VDisk(VMWare):
         result = self.vdiskmanager("-d \"{0}\"".format(self.vmdk))
         return result
 
+    async def shrinkAsync(self):
+        return await self.vdiskmanagerAsync("-k \"{0}\"".format(self.vmdk))
+
+    async def defragmentAsync(self):
+        return await self.vdiskmanagerAsync("-d \"{0}\"".format(self.vmdk))
+
+    # Background operations, one job per virtual disk
+    def getJob(self):
+        return Job('vdisk', self.vmdk)
+
+    def startJob(self, operation, limit= 2):
+        """Starts shrink or defragment in a background process, at most limit disks are processed at the same time"""
+        option = dict(shrink= '-k', defragment= '-d')[operation]
+        return self.getJob().start(self.vdiskmanagerCommand('{0} "{1}"'.format(option, self.vmdk)), limit, operation= operation)
+
 if __name__ == '__main__':
     vdisk= VDisk()
\ No newline at end of file
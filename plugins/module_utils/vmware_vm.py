@@ -1,16 +1,43 @@
-import os.path
+import glob, os.path, re
+from functools import cached_property
 
 try:
     from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware import VMWare
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_fastclone import FastClone
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_powerstate import PowerState
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_snapshot import SnapshotTree
 except:
     from module_utils.vmware import VMWare
+    from module_utils.vmware_fastclone import FastClone
+    from module_utils.vmware_powerstate import PowerState
+    from module_utils.vmware_snapshot import SnapshotTree
 
 class VM(VMWare):
     
-    def __init__(self, name) -> None:
-        super().__init__()
+    def __init__(self, name, host= None) -> None:
+        super().__init__(host)
         self.name = name
-        self.vmpath = self.__getPath()
+
+    @staticmethod
+    def fromPath(name, vmpath, host= None):
+        """Returns the VM of a known vmx path, for VMs that can't be found by name because their vmx basename isn't unique"""
+        vm = VM(name, host)
+        vm.vmpath = vmpath
+        return vm
+
+    @staticmethod
+    def select(host, name= None, names= None, pattern= None, regex= False):
+        """Returns the VMs selected by name, by names or by pattern on the registered VMs"""
+        if name != None:
+            return [VM(name, host)]
+        if names != None:
+            return [VM(name, host) for name in names]
+        # Registered VMs are built from their vmx path, their name is only unique in the inventory
+        return [VM.fromPath(name, vmx, host) for name, vmx in VMWare(host).findInventoryVms(pattern, regex).items()]
+
+    @cached_property
+    def vmpath(self):
+        return self.__getPath()
 
     # State information
     
@@ -23,19 +50,40 @@ class VM(VMWare):
 
     def exists(self):
         return self.vmpath != ''
+
+    def getDiskSize(self, filename):
+        """Returns the size in bytes of a virtual disk including its extents, relative paths are resolved from the VM folder"""
+        vmdk = self.tolocalpath(filename)
+        if os.path.isabs(vmdk) == False and re.match(r'^[a-z]:', filename, re.IGNORECASE) == None:
+            vmdk = os.path.join(os.path.dirname(self.tolocalpath(self.vmpath)), vmdk)
+        stem = glob.escape(vmdk[:-len('.vmdk')])
+        files = set([vmdk] + glob.glob(stem + '-s[0-9][0-9][0-9].vmdk') + glob.glob(stem + '-f[0-9][0-9][0-9].vmdk') + glob.glob(stem + '-flat.vmdk'))
+        return sum(os.path.getsize(file) for file in files if os.path.isfile(file))
+
+    def getDevices(self):
+        """Returns the vmx keys of the disk and cdrom devices by device host, for example sata0:1"""
+        result = dict()
+        for key, value in self.getVmxConfig(self.vmpath).items():
+            match = re.match(r'^((?:ide|scsi|sata|nvme)\d+:\d+)\.(.+)$', key, re.IGNORECASE)
+            if match != None:
+                result.setdefault(match.group(1).casefold(), dict())[match.group(2)] = value
+        return result
     
     def getPath(self):
         return self.vmpath
     
     def __getPath(self):
-        inventory = self.getInventory()
+        inventory = self.getInventoryIndex()
+        entry = inventory.find(self.name)
+        if entry != None:
+            return entry['config'].casefold()
+
         vmxfile = '/' + self.name + ".vmx"
         if self.wsl:
             vmxfile = vmxfile.replace("/", "\\")
-
-        for key, value in inventory.items():
-            if vmxfile.casefold() in value.casefold():
-                return value.casefold()
+        path = inventory.search(vmxfile)
+        if path != None:
+            return path.casefold()
         
         defaultvmpath = self.getPreferences()['prefvmx.defaultVMPath']
         vmpath = "{0}/{1}/{1}.vmx".format(defaultvmpath, self.name)
@@ -49,15 +97,7 @@ class VM(VMWare):
         return ''
     
     def getPowerState(self):
-        running = self.getRunningvms()
-        for key, value in running.items():
-            if value.casefold() == self.vmpath.casefold():
-                #Test to see if VM is paused
-                pausetest = self.execute('-gu guest -gp guest listProcessesInGuest')
-                if 'virtual machine is paused' in pausetest:
-                    return 'paused'
-                return "started"
-        return "stopped"
+        return PowerState(self).state(self)
     
     # Power commands
 
@@ -83,6 +123,13 @@ class VM(VMWare):
     def getSnapshots(self):
         return self.execute('listSnapshots')
 
+    def getSnapshotTree(self):
+        """Returns the snapshots read from the .vmsd file of the VM"""
+        vmsdpath = re.sub(r'\.vmx$', '.vmsd', self.vmpath, flags= re.IGNORECASE)
+        if self.vmpath == '' or os.path.isfile(self.tolocalpath(vmsdpath)) == False:
+            return SnapshotTree([])
+        return SnapshotTree.parse(self.getVmxConfig(vmsdpath))
+
     def createSnapshot(self, name):
         return self.execute('snapshot', name)
 
@@ -95,21 +142,39 @@ class VM(VMWare):
     # General commands
 
     def cloneTo(self, targetname, option= 'full', snapshot= ''):
+        return self.host.executor.call(self.cloneToAsync(targetname, option, snapshot))
+
+    async def cloneToAsync(self, targetname, option= 'full', snapshot= ''):
         if self.exists() == False:
             raise Exception("Template VM does not exist")
-        targetvmpath = self.getPreferences()['prefvmx.defaultVMPath']
-        targetvmpath = "{0}/{1}/{1}.vmx".format(targetvmpath, targetname)
-        if self.wsl:
-            targetvmpath = targetvmpath.replace("/", "\\")
+        targetvmpath = self.getClonePath(targetname)
         cmd = ' '.join(['clone', '"{}"'.format(self.vmpath), '"{}"'.format(targetvmpath), '-cloneName="{}"'.format(targetname), option])
         if snapshot != '':
             cmd = '%s -snapshot="%s"' % (cmd, snapshot)
-        result = self.vmrun(cmd)
+        result = await self.vmrunAsync(cmd)
         return result
 
+    def fastCloneTo(self, targetname):
+        return self.host.executor.call(self.fastCloneToAsync(targetname))
+
+    async def fastCloneToAsync(self, targetname):
+        """Full clone of a stopped VM by copying its files, see FastClone"""
+        return await FastClone(self, targetname).run()
+
+    def getClonePath(self, targetname):
+        """Returns the vmx path of a new VM in the default VM folder"""
+        targetvmpath = self.getPreferences()['prefvmx.defaultVMPath']
+        targetvmpath = "{0}/{1}/{1}.vmx".format(targetvmpath, targetname)
+        if self.wsl:
+            targetvmpath = targetvmpath.replace("/", "\\")
+        return targetvmpath
+
     # Helper function to execute vmrun commands
-    def execute(self, command, parameter= ''):
-        result = self.vmrun(' '.join([command, '"{}" {}'.format(self.vmpath, parameter)]))
+    def execute(self, command, parameter= '', timeout= None):
+        return self.host.executor.call(self.executeAsync(command, parameter, timeout))
+
+    async def executeAsync(self, command, parameter= '', timeout= None):
+        result = await self.vmrunAsync(' '.join([command, '"{}" {}'.format(self.vmpath, parameter)]), timeout)
         return result.strip('\n').replace('\r', '');
 
 if __name__ == '__main__':
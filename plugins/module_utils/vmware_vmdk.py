@@ -0,0 +1,269 @@
+import array, os, re, struct, sys
+
+SECTOR = 512
+
+class Vmdk:
+    """VMDK virtual disk read from its text descriptor and the headers of its sparse extents.
+    The descriptor is either a separate text file or embedded in a monolithic sparse extent.
+    Extent and parent file names are resolved with tolocal, which converts a path of the VMware host to a local path."""
+
+    # SparseExtentHeader of hosted sparse extents, the KDMV magic is 0x564d444b
+    HEADER = struct.Struct('<IIIQQQQIQQQB4cH')
+    MAGIC = 0x564d444b
+    # Header flags: redundant grain table, zeroed-grain GTEs
+    FLAG_ZEROGTE = 0x4
+    GD_AT_END = 0xffffffffffffffff
+    HEADERFIELDS = ('magic', 'version', 'flags', 'capacity', 'grainSize', 'descriptorOffset', 'descriptorSize', 'numGTEsPerGT', 'rgdOffset', 'gdOffset', 'overHead', 'uncleanShutdown')
+
+    EXTENT = re.compile(r'^(RW|RDONLY|NOACCESS)\s+(\d+)\s+(\w+)(?:\s+"(.*)"(?:\s+(\d+))?)?\s*$')
+    ENTRY = re.compile(r'^\s*([^#=\s][^=]*?)\s*=\s*(.*?)\s*$')
+
+    def __init__(self, path, descriptor, tolocal= None) -> None:
+        self.path = path
+        self.tolocal = tolocal if tolocal != None else (lambda path: path)
+        self.entries = dict()
+        self.ddb = dict()
+        self.extents = []
+        for line in descriptor.splitlines():
+            match = self.EXTENT.match(line.strip())
+            if match != None:
+                self.extents.append(dict(access= match.group(1), sectors= int(match.group(2)), type= match.group(3), file= match.group(4), offset= int(match.group(5) or 0)))
+                continue
+            match = self.ENTRY.match(line)
+            if match != None:
+                value = match.group(2)
+                if len(value) >= 2 and value.startswith('"') and value.endswith('"'):
+                    value = value[1:-1]
+                if match.group(1).startswith('ddb.'):
+                    self.ddb[match.group(1)[len('ddb.'):]] = value
+                else:
+                    self.entries[match.group(1)] = value
+
+    @staticmethod
+    def read(path, tolocal= None):
+        """Reads the descriptor of the disk at path, a host path converted by tolocal"""
+        localpath = tolocal(path) if tolocal != None else path
+        with open(localpath, 'rb') as content:
+            data = content.read(SECTOR)
+            header = Vmdk.header(data)
+            if header != None:
+                if header['descriptorOffset'] == 0:
+                    raise ValueError('{} is a sparse extent without descriptor'.format(path))
+                content.seek(header['descriptorOffset'] * SECTOR)
+                data = content.read(header['descriptorSize'] * SECTOR)
+            else:
+                # A text descriptor is small, a larger file is a flat extent
+                data += content.read(65536)
+        text = data.split(b'\0', 1)[0].decode('utf-8', errors= 'replace')
+        if '# Disk DescriptorFile' not in text and 'createType' not in text:
+            raise ValueError('{} is not a VMDK descriptor'.format(path))
+        return Vmdk(path, text, tolocal)
+
+    @staticmethod
+    def header(data):
+        """Returns the fields of a sparse extent header, or None when data doesn't start with one"""
+        if len(data) < Vmdk.HEADER.size:
+            return None
+        values = Vmdk.HEADER.unpack_from(data)
+        if values[0] != Vmdk.MAGIC:
+            return None
+        header = dict(zip(Vmdk.HEADERFIELDS, values))
+        header['compressAlgorithm'] = values[-1]
+        return header
+
+    # Descriptor values
+
+    @property
+    def cid(self):
+        return self.entries.get('CID')
+
+    @property
+    def parentcid(self):
+        return self.entries.get('parentCID')
+
+    @property
+    def createtype(self):
+        return self.entries.get('createType')
+
+    @property
+    def parenthint(self):
+        return self.entries.get('parentFileNameHint')
+
+    @property
+    def capacity(self):
+        return sum(extent['sectors'] for extent in self.extents) * SECTOR
+
+    def extentpath(self, filename):
+        """Returns the host path of an extent or parent file, relative names are resolved from the folder of the descriptor"""
+        if re.match(r'^([a-z]:|[\\/])', filename, re.IGNORECASE) != None:
+            return filename
+        match = re.match(r'^(.*[\\/])[^\\/]*$', self.path)
+        return (match.group(1) if match != None else '') + filename
+
+    def parent(self):
+        """Returns the parent disk of a delta disk, or None"""
+        if self.parenthint in (None, ''):
+            return None
+        return Vmdk.read(self.extentpath(self.parenthint), self.tolocal)
+
+    # Facts
+
+    def extentfacts(self):
+        """Returns the extents with their file size, and the header of sparse extents"""
+        result = []
+        for extent in self.extents:
+            fact = dict(extent)
+            if extent['file'] != None:
+                fact['path'] = self.extentpath(extent['file'])
+                try:
+                    with open(self.tolocal(fact['path']), 'rb') as content:
+                        fact['allocated'] = os.fstat(content.fileno()).st_size
+                        if extent['type'] in ('SPARSE', 'VMFSSPARSE'):
+                            fact['header'] = Vmdk.header(content.read(SECTOR))
+                except OSError:
+                    fact['allocated'] = None
+                    fact['missing'] = True
+            result.append(fact)
+        return result
+
+    def facts(self, parents= True):
+        """Returns the disk facts, with the parent chain of a delta disk"""
+        extents = self.extentfacts()
+        allocated = sum(extent.get('allocated') or 0 for extent in extents)
+        try:
+            descriptorsize = os.path.getsize(self.tolocal(self.path))
+        except OSError:
+            descriptorsize = 0
+        if all(extent.get('path', '').casefold() != self.path.casefold() for extent in extents):
+            allocated += descriptorsize
+
+        result = dict(
+            path= self.path,
+            capacity= self.capacity,
+            allocated= allocated,
+            adapter= self.ddb.get('adapterType'),
+            createType= self.createtype,
+            CID= self.cid,
+            parentCID= self.parentcid,
+            parentFileNameHint= self.parenthint,
+            virtualHWVersion= self.ddb.get('virtualHWVersion'),
+            extents= extents,
+            missing= [extent['path'] for extent in extents if extent.get('missing', False)]
+        )
+        if parents:
+            result['chain'] = self.chain()
+        return result
+
+    def chain(self, limit= 64):
+        """Returns the parents of a delta disk up to the base disk.
+        consistent is False when the parentCID of a disk doesn't match the CID of its parent."""
+        result = []
+        child = self
+        visited = set([self.path.casefold()])
+        while child.parenthint not in (None, '') and len(result) < limit:
+            path = child.extentpath(child.parenthint)
+            if path.casefold() in visited:
+                result.append(dict(path= path, error= 'Loop in the parent chain'))
+                break
+            visited.add(path.casefold())
+            try:
+                parent = child.parent()
+            except (OSError, ValueError) as e:
+                result.append(dict(path= path, error= str(e)))
+                break
+            result.append(dict(
+                path= path,
+                CID= parent.cid,
+                parentCID= parent.parentcid,
+                createType= parent.createtype,
+                consistent= child.parentcid == parent.cid
+            ))
+            child = parent
+        return result
+
+    # Shrink and defragment estimates
+
+    def estimate(self, scan= False):
+        """Estimates the gain of shrink and defragment from the grain directories and grain tables of the sparse extents.
+        slack is the space of the extent files not used by allocated grains. With scan, allocated grains
+        containing only zeros are counted as reclaimable too, this reads all allocated data."""
+        extents = []
+        for extent in self.extents:
+            if extent['type'] == 'SPARSE' and extent['file'] != None:
+                extents.append(self.__estimateExtent(self.extentpath(extent['file']), scan))
+
+        supported = [extent for extent in extents if 'error' not in extent]
+        filebytes = sum(extent['fileBytes'] for extent in supported)
+        allocated = sum(extent['allocatedBytes'] for extent in supported)
+        reclaimable = sum(extent['slackBytes'] + extent.get('zeroBytes', 0) for extent in supported)
+        breaks = sum(extent['breaks'] for extent in supported)
+        runs = sum(max(0, extent['allocatedGrains'] - 1) for extent in supported)
+        return dict(
+            capacity= self.capacity,
+            allocatedBytes= allocated,
+            allocatedPercent= round(allocated * 100 / self.capacity, 2) if self.capacity > 0 else 0,
+            fileBytes= filebytes,
+            reclaimableBytes= reclaimable,
+            shrinkGain= round(reclaimable * 100 / filebytes, 2) if filebytes > 0 else 0,
+            fragmentation= round(breaks * 100 / runs, 2) if runs > 0 else 0,
+            scanned= scan,
+            extents= extents
+        )
+
+    def __estimateExtent(self, path, scan):
+        result = dict(path= path)
+        with open(self.tolocal(path), 'rb') as content:
+            header = Vmdk.header(content.read(SECTOR))
+            if header == None or header['compressAlgorithm'] != 0 or header['gdOffset'] in (0, self.GD_AT_END):
+                result['error'] = 'Unsupported extent, only uncompressed hosted sparse extents can be estimated'
+                return result
+
+            grain = header['grainSize'] * SECTOR
+            grains = -(-header['capacity'] // header['grainSize'])
+            tables = -(-grains // header['numGTEsPerGT'])
+            directory = self.__entries(content, header['gdOffset'] * SECTOR, tables)
+
+            # Sector offsets of the allocated grains in virtual disk order
+            offsets = []
+            zerograins = 0
+            zeroed = header['flags'] & self.FLAG_ZEROGTE != 0
+            for table in directory:
+                if table == 0:
+                    continue
+                for entry in self.__entries(content, table * SECTOR, header['numGTEsPerGT']):
+                    if entry > 1 or (entry == 1 and zeroed == False):
+                        offsets.append(entry)
+                    elif entry == 1:
+                        zerograins += 1
+
+            filebytes = os.fstat(content.fileno()).st_size
+            result.update(
+                grains= grains,
+                allocatedGrains= len(offsets),
+                zeroGrains= zerograins,
+                allocatedBytes= len(offsets) * grain,
+                fileBytes= filebytes,
+                slackBytes= max(0, filebytes - header['overHead'] * SECTOR - len(offsets) * grain),
+                breaks= sum(1 for previous, current in zip(offsets, offsets[1:]) if current != previous + header['grainSize'])
+            )
+            if scan:
+                result['zeroBytes'] = self.__zerograins(content, sorted(offsets), grain) * grain
+        return result
+
+    def __entries(self, content, position, count):
+        content.seek(position)
+        entries = array.array('I')
+        entries.frombytes(content.read(count * 4).ljust(count * 4, b'\0'))
+        if sys.byteorder == 'big':
+            entries.byteswap()
+        return entries
+
+    def __zerograins(self, content, offsets, grain):
+        # Reads the grains in file order, so the extent is read sequentially
+        zero = bytes(grain)
+        count = 0
+        for offset in offsets:
+            content.seek(offset * SECTOR)
+            if content.read(grain) == zero:
+                count += 1
+        return count
@@ -0,0 +1,91 @@
+import os, re, tempfile
+
+class VmxDocument:
+    """Order preserving model of a vmx file, or another VMware file using the same key = "value" format.
+    Comments, blank lines and the formatting of untouched entries are written back unchanged.
+    Keys are case-insensitive, like VMware handles them."""
+
+    ENTRY = re.compile(r'^\s*([^#=\s][^=]*?)\s*=\s*(.*?)\s*$')
+
+    def __init__(self, text= '') -> None:
+        self.newline = '\r\n' if '\r\n' in text else '\n'
+        self.lines = []
+        self.index = dict()
+        self.changed = False
+        for line in text.splitlines():
+            match = self.ENTRY.match(line)
+            if match == None:
+                self.lines.append([line, None, None])
+                continue
+            key, value = match.group(1), match.group(2)
+            if len(value) >= 2 and value.startswith('"') and value.endswith('"'):
+                value = value[1:-1]
+            self.index[key.casefold()] = len(self.lines)
+            self.lines.append([line, key, value])
+
+    @staticmethod
+    def read(path):
+        with open(path, 'r', encoding= 'utf-8', errors= 'surrogateescape', newline= '') as content:
+            return VmxDocument(content.read())
+
+    def todict(self):
+        return dict((line[1], line[2]) for number, line in enumerate(self.lines) if line[1] != None and self.index[line[1].casefold()] == number)
+
+    def keys(self):
+        return [self.lines[position][1] for position in sorted(self.index.values())]
+
+    def get(self, key, default= None):
+        position = self.index.get(key.casefold())
+        return default if position == None else self.lines[position][2]
+
+    def set(self, key, value):
+        """Sets a value, returns True when the document changed"""
+        value = str(value)
+        position = self.index.get(key.casefold())
+        if position != None:
+            if self.lines[position][2] == value:
+                return False
+            key = self.lines[position][1]
+            self.lines[position] = ['{0} = "{1}"'.format(key, value), key, value]
+        else:
+            self.index[key.casefold()] = len(self.lines)
+            self.lines.append(['{0} = "{1}"'.format(key, value), key, value])
+        self.changed = True
+        return True
+
+    def remove(self, key):
+        """Removes a key, returns True when the document changed"""
+        position = self.index.pop(key.casefold(), None)
+        if position == None:
+            return False
+        self.lines[position] = None
+        self.lines = [line for line in self.lines if line != None]
+        self.index = dict((line[1].casefold(), number) for number, line in enumerate(self.lines) if line[1] != None)
+        self.changed = True
+        return True
+
+    def text(self):
+        return ''.join(line[0] + self.newline for line in self.lines)
+
+    def write(self, path):
+        """Atomically replaces the file when the document changed, returns True when written"""
+        if self.changed == False:
+            return False
+        directory = os.path.dirname(path) or '.'
+        fd, tmppath = tempfile.mkstemp(dir= directory, prefix= '.' + os.path.basename(path) + '.')
+        try:
+            with os.fdopen(fd, 'w', encoding= 'utf-8', errors= 'surrogateescape', newline= '') as content:
+                content.write(self.text())
+            try:
+                os.chmod(tmppath, os.stat(path).st_mode & 0o7777)
+            except OSError:
+                pass
+            os.replace(tmppath, path)
+        except BaseException:
+            try:
+                os.remove(tmppath)
+            except OSError:
+                pass
+            raise
+        self.changed = False
+        return True
@@ -21,11 +21,9 @@ options:
         type: str
     path:
         description: The path to iso file, driveletter or device-name
-        required: true
         type: str
     devicehost:
         description: Set the device host, for example sata0:1
-        required: true
         type: str
     devicetype:
         description: Set the device type
@@ -39,6 +37,35 @@ options:
         description: Device is connected at bootup of VM
         type: bool
         default: true
+    devices:
+        description: Mount multiple devices with a single vmx update, instead of path and devicehost
+        type: list
+        elements: dict
+        options:
+            path:
+                description: The path to iso file, driveletter or device-name
+                required: true
+                type: str
+            devicehost:
+                description: Set the device host, for example sata0:1
+                required: true
+                type: str
+            deviceType:
+                description: Set the device type
+                type: str
+                default: cdrom-image
+            present:
+                description: Present the device to the GUI and to the virtual machine
+                type: bool
+                default: true
+            startConnected:
+                description: Device is connected at bootup of VM
+                type: bool
+                default: true
+    exclusive:
+        description: Detach all cdrom devices of the virtual machine that are not listed
+        type: bool
+        default: false
 
 author:
     - Eddy Vermoen (@ben-eddy74)
@@ -50,12 +77,35 @@ EXAMPLES = r'''
     name: my virtual machine
     path: c:\\vmware\\my virtual machine\\windows.iso
     devicehost: sata0:1
+
+- name: Mount the installation media, and detach all other cdroms
+  ben_eddy74.vmware_wpro.vmware_wpro_cdrom_mount:
+    name: my virtual machine
+    exclusive: true
+    devices:
+      - path: c:\\software\\windows.iso
+        devicehost: sata0:1
+      - path: c:\\software\\sql.iso
+        devicehost: sata0:2
 '''
 
 RETURN = r'''
-
+changes:
+    description: The changed vmx keys, after is null for removed keys
+    type: dict
+    returned: always
+    sample: '
+        "changed": true,
+        "changes": {
+            "sata0:2.fileName": {
+                "before": null,
+                "after": "c:\\software\\sql.iso"
+            }
+        }
+    '
 '''
 
+import re
 from ansible.module_utils.basic import AnsibleModule
 try:
     from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_vm import VM
@@ -66,11 +116,20 @@ def run_module():
 
     module_args = dict(
         name=dict(type='str', required=True),
-        path=dict(type='str', required=True),
-        devicehost=dict(type='str', required=True),
+        path=dict(type='str'),
+        devicehost=dict(type='str'),
         deviceType =dict(type='str', default="cdrom-image"),
         present=dict(type='bool', default=True),
-        startConnected=dict(type='bool', default=True)
+        startConnected=dict(type='bool', default=True),
+        devices=dict(type='list', elements='dict', options=dict(
+            path=dict(type='str', required=True),
+            devicehost=dict(type='str', required=True),
+            deviceType=dict(type='str', default="cdrom-image"),
+            present=dict(type='bool', default=True),
+            startConnected=dict(type='bool', default=True)
+            )
+        ),
+        exclusive=dict(type='bool', default=False)
     )
 
     result = dict(
@@ -79,6 +138,16 @@ def run_module():
 
     module = AnsibleModule(
         argument_spec=module_args,
+        mutually_exclusive=[
+            ('devices', 'path'),
+            ('devices', 'devicehost')
+        ],
+        required_one_of=[
+            ('devices', 'devicehost')
+        ],
+        required_together=[
+            ('path', 'devicehost')
+        ],
         supports_check_mode=True
     )
 
@@ -87,29 +156,33 @@ def run_module():
     if vm.exists() == False:
         module.fail_json("VM {} not found".format(module.params['name']))
 
+    devices = module.params['devices']
+    if devices == None:
+        devices = [dict((k, module.params[k]) for k in ('path', 'devicehost', 'deviceType', 'present', 'startConnected'))]
+
+    devicehosts = [device['devicehost'].casefold() for device in devices]
+    for device in devices:
+        if re.match(r'^(ide|scsi|sata|nvme)\d+:\d+$', device['devicehost'], re.IGNORECASE) == None:
+            module.fail_json("Invalid device host {}".format(device['devicehost']))
+        if devicehosts.count(device['devicehost'].casefold()) > 1:
+            module.fail_json("Device host {} is used more than once".format(device['devicehost']))
+
     config = dict()
-    config[module.params['devicehost'] + '.fileName'] = module.params['path']
-    config[module.params['devicehost'] + '.deviceType'] = module.params['deviceType']
-    config[module.params['devicehost'] + '.present'] = "TRUE" if module.params['present'] else "FALSE"
-    config[module.params['devicehost'] + '.startConnected'] = "TRUE" if module.params['startConnected'] else "FALSE"
-    
-    currentconfig = vm.facts()["config"]
-
-    for k, v in config.items():
-        if k in currentconfig:
-            if currentconfig[k] != v:
-                currentconfig[k] = v
-                result['changed'] = True
-        else:
-            currentconfig[k] = v
-            result['changed'] = True
-
-    if module.check_mode:
-        module.exit_json(**result)
-
-    if result['changed']:
-        vm.setVmxConfig(config)
-    
+    for device in devices:
+        config[device['devicehost'] + '.fileName'] = device['path']
+        config[device['devicehost'] + '.deviceType'] = device['deviceType']
+        config[device['devicehost'] + '.present'] = "TRUE" if device['present'] else "FALSE"
+        config[device['devicehost'] + '.startConnected'] = "TRUE" if device['startConnected'] else "FALSE"
+
+    remove = []
+    if module.params['exclusive']:
+        for devicehost, keys in vm.getDevices().items():
+            if devicehost not in devicehosts and 'cdrom' in keys.get('deviceType', '').casefold():
+                remove += [devicehost + '.' + k for k in keys.keys()]
+
+    result['changes'] = vm.setVmxConfig(config, remove, dryrun= module.check_mode)
+    result['changed'] = len(result['changes']) > 0
+
     module.exit_json(**result)
 
 def main():
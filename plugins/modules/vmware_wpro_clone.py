@@ -16,9 +16,20 @@ description: This module clones a virtual machine to a new virtual machine
 
 options:
     name:
-        description: The name of the new virtual machine
-        required: true
+        description:
+            - The name of the new virtual machine
+            - With count, a pattern formatted with the clone number, for example ci-{:02d}
         type: str
+    names:
+        description: The names of multiple new virtual machines, cloned in parallel
+        type: list
+        elements: str
+    count:
+        description: Number of clones to create in parallel, named after the name pattern
+        type: int
+    parallel:
+        description: Maximum number of clones created in parallel. Defaults to 16 for linked clones and 2 for full clones
+        type: int
     template:
         description: The name of the virtual machine to be cloned
         required: true
@@ -31,6 +42,17 @@ options:
     snapshot:
         description: Name of the template VM snapshot to clone
         type: str
+    engine:
+        description:
+            - vmrun clones with vmrun. fast makes a full clone of a stopped template by copying the files of its folder in parallel,
+              using reflinks or copy_file_range when the filesystem supports them and skipping the holes of sparse files
+            - A fast clone gets a new uuid.bios, new MAC addresses and its own displayName, and is registered in the inventory
+            - Absolute paths into the template folder, in the vmx and in the disk descriptors, are changed to the folder of the clone
+            - The snapshots of the template are copied with their memory files, the memory and suspend state of the template itself are not
+            - fast requires clone full, and can't be combined with snapshot
+        type: str
+        choices: vmrun, fast
+        default: vmrun
 
 author:
     - Eddy Vermoen (@ben-eddy74)
@@ -41,6 +63,20 @@ EXAMPLES = r'''
   ben_eddy74.vmware_wpro.vmware_wpro_clone:
     name: My Windows Server
     template: Windows Server 2019
+
+- name: Create 30 linked clones ci-01 to ci-30 from a snapshot
+  ben_eddy74.vmware_wpro.vmware_wpro_clone:
+    name: ci-{:02d}
+    count: 30
+    template: Windows Server 2019
+    snapshot: Base
+    clone: linked
+
+- name: Fast full clone of a stopped template
+  ben_eddy74.vmware_wpro.vmware_wpro_clone:
+    name: build-01
+    template: Windows Server 2019
+    engine: fast
 '''
 
 RETURN = r'''
@@ -58,21 +94,101 @@ cloneresult:
         }
     }
     '
+fastclone:
+    description: Result of the fast engine, with the method used per file and the number of bytes actually copied
+    type: dict
+    returned: when engine is fast and the clone was created
+    sample: '
+        "fastclone": {
+            "uuid": "56 4d 9c 2e 8b 1f 07 5b-d9 5b 4b 13 1e 6a 2a 8f",
+            "macs": {
+                "ethernet0": "00:0c:29:6a:2a:8f"
+            },
+            "vmx": "C:\\vms\\build-01\\build-01.vmx",
+            "files": [
+                {
+                    "name": "Windows Server 2019.vmdk",
+                    "bytes": 21474836480,
+                    "method": "reflink",
+                    "copied": 0
+                }
+            ],
+            "bytes": 21474845736,
+            "copied": 0
+        }
+    '
+clones:
+    description: Result per clone when names or count is used
+    type: list
+    returned: when names or count is used
+    sample: '
+    "clones": [
+        {
+            "name": "ci-01",
+            "changed": true,
+            "cloneresult": "",
+            "elapsed": 4.21
+        }
+    ]
+    '
 '''
 
+import time
 from ansible.module_utils.basic import AnsibleModule
 try:
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware import HostContext
     from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_vm import VM
 except:
+    from module_utils.vmware import HostContext
     from module_utils.vmware_vm import VM
 
+async def fastclone(vmtemplate, name, result):
+    """Clones with the fast engine, returns an empty string when successful like vmrun"""
+    try:
+        result['fastclone'] = await vmtemplate.fastCloneToAsync(name)
+    except (OSError, ValueError) as e:
+        return "Error: {}".format(e)
+    return ""
+
+async def clone(vmtemplate, vm, params, check_mode):
+    """Clones the template to one new virtual machine and returns its result"""
+    result = dict(
+        name= vm.name,
+        changed= False,
+    )
+
+    if vm.exists():
+        result['cloneresult'] = "Virtual machine already exists"
+        return result
+
+    if check_mode:
+        result['changed'] = True
+        return result
+
+    started = time.monotonic()
+    if params['engine'] == 'fast':
+        cloneresult = await fastclone(vmtemplate, vm.name, result)
+    else:
+        cloneresult = await vmtemplate.cloneToAsync(targetname= vm.name, option= params['clone'], snapshot= params['snapshot'])
+    cloneresult = cloneresult.strip('\r\n')
+
+    result['elapsed'] = round(time.monotonic() - started, 2)
+    result['failed'] = "Error" in cloneresult
+    result['changed'] = "" == cloneresult
+    result['cloneresult'] = cloneresult
+    return result
+
 def run_module():
 
     module_args = dict(
-        name=dict(type='str', required=True),
+        name=dict(type='str'),
+        names=dict(type='list', elements='str'),
+        count=dict(type='int'),
+        parallel=dict(type='int'),
         template=dict(type='str', required=True),
         clone=dict(type='str', required=False, choices=['full', 'linked'], default= 'full'),
-        snapshot=dict(type='str', required=False, default='')
+        snapshot=dict(type='str', required=False, default=''),
+        engine=dict(type='str', choices=['vmrun', 'fast'], default='vmrun')
     )
 
     result = dict(
@@ -81,23 +197,65 @@ def run_module():
 
     module = AnsibleModule(
         argument_spec=module_args,
+        mutually_exclusive=[
+            ('name', 'names'),
+            ('names', 'count')
+        ],
+        required_one_of=[
+            ('name', 'names')
+        ],
         supports_check_mode=True
     )
 
-    vm = VM(module.params['name'])
-    vmtemplate = VM(module.params['template'])
-    
-    if module.check_mode:
-        if vm.exists() == False:
-            result['changed'] = True
+    if module.params['engine'] == 'fast' and (module.params['clone'] != 'full' or module.params['snapshot'] != ''):
+        module.fail_json("engine fast requires clone full and can't clone a snapshot")
+
+    if module.params['names'] == None and module.params['count'] == None:
+        host = HostContext()
+        vm = VM(module.params['name'], host)
+        vmtemplate = VM(module.params['template'], host)
+        
+        if module.check_mode:
+            if vm.exists() == False:
+                result['changed'] = True
+            module.exit_json(**result)
+        
+        if module.params['engine'] == 'fast':
+            cloneresult = host.executor.call(fastclone(vmtemplate, module.params['name'], result))
+        else:
+            cloneresult = vmtemplate.cloneTo(targetname= module.params['name'], option= module.params['clone'], snapshot= module.params['snapshot'])
+        cloneresult = cloneresult.strip('\r\n')
+
+        result['failed'] = "Error" in cloneresult
+        result['changed'] = "" == cloneresult
+        result['cloneresult'] = cloneresult
+
         module.exit_json(**result)
-    
-    cloneresult = vmtemplate.cloneTo(targetname= module.params['name'], option= module.params['clone'], snapshot= module.params['snapshot'])
-    cloneresult = cloneresult.strip('\r\n')
 
-    result['failed'] = "Error" in cloneresult
-    result['changed'] = "" == cloneresult
-    result['cloneresult'] = cloneresult
+    names = module.params['names']
+    if names == None:
+        pattern = module.params['name'] if '{' in module.params['name'] else module.params['name'] + '-{}'
+        names = [pattern.format(number) for number in range(1, module.params['count'] + 1)]
+
+    # Linked clones only write a small delta disk, full clones copy all disks
+    parallel = module.params['parallel']
+    if parallel == None:
+        parallel = 16 if module.params['clone'] == 'linked' else 2
+
+    host = HostContext(concurrency= parallel)
+    vmtemplate = VM(module.params['template'], host)
+    if vmtemplate.exists() == False:
+        module.fail_json("Template VM {} not found".format(module.params['template']))
+
+    vms = [VM(name, host) for name in names]
+    clones = host.executor.gather(*[clone(vmtemplate, vm, module.params, module.check_mode) for vm in vms])
+    clones = [dict(name= vm.name, changed= False, failed= True, cloneresult= str(cloneresult)) if isinstance(cloneresult, Exception) else cloneresult for vm, cloneresult in zip(vms, clones)]
+
+    result['clones'] = clones
+    result['changed'] = any(cloneresult['changed'] for cloneresult in clones)
+    failed = [cloneresult['name'] for cloneresult in clones if cloneresult.get('failed', False)]
+    if len(failed) > 0:
+        module.fail_json("Clone failed for {}".format(', '.join(failed)), **result)
 
     module.exit_json(**result)
 
@@ -0,0 +1,166 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Eddy Vermoen (@ben-eddy74)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: vmware_wpro_footprint
+
+short_description: Disk footprint of virtual machines
+version_added: "1.0.0"
+
+description: This module reports the disk space used by the folders of virtual machines, split in base disks,
+             snapshot deltas, suspend and memory files, logs and other files.
+             Parent disks shared by linked clones are reported per virtual machine, and counted once in the totals.
+             File sizes are read on every run, the classification of the files of a folder is cached until the modification time of the folder changes.
+
+options:
+    name:
+        description: The name of the virtual machine
+        type: str
+    names:
+        description: The names of the virtual machines
+        type: list
+        elements: str
+    pattern:
+        description: Select all virtual machines of the inventory with a name matching this glob pattern
+        type: str
+        default: '*'
+    regex:
+        description: Interpret pattern as a regular expression instead of a glob pattern
+        type: bool
+        default: false
+    refresh:
+        description: Ignore the cached classification of the files, for example after editing disk descriptors in place
+        type: bool
+        default: false
+    workers:
+        description: Maximum number of folders scanned in parallel
+        type: int
+        default: 8
+
+author:
+    - Eddy Vermoen (@ben-eddy74)
+'''
+
+EXAMPLES = r'''
+- name: Disk usage of all registered virtual machines
+  ben_eddy74.vmware_wpro.vmware_wpro_footprint:
+  register: footprint
+
+- name: Disk usage of the CI clones
+  ben_eddy74.vmware_wpro.vmware_wpro_footprint:
+    pattern: ci-*
+'''
+
+RETURN = r'''
+vms:
+    description: Footprint per virtual machine in bytes, largest first
+    type: list
+    returned: always
+    sample: '
+        "vms": [
+            {
+                "name": "ci-01",
+                "vmx": "c:\\vms\\ci-01\\ci-01.vmx",
+                "directory": "c:\\vms\\ci-01",
+                "bytes": 2254857830,
+                "categories": {
+                    "base": 1073741824,
+                    "snapshot": 0,
+                    "memory": 1073741824,
+                    "logs": 1048576,
+                    "other": 106325606
+                },
+                "shared": [
+                    {
+                        "path": "C:\\vms\\Tpl\\Tpl.vmdk",
+                        "bytes": 21474836480
+                    }
+                ]
+            }
+        ]
+    '
+totals:
+    description: Sum of all virtual machines in bytes, with the shared parent disks counted once
+    type: dict
+    returned: always
+    sample: '
+        "totals": {
+            "bytes": 23729694310,
+            "categories": {
+                "base": 1073741824,
+                "snapshot": 0,
+                "memory": 1073741824,
+                "logs": 1048576,
+                "other": 106325606
+            },
+            "shared": 21474836480
+        }
+    '
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+try:
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware import HostContext, VMWare
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_footprint import Footprint
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_vm import VM
+except:
+    from module_utils.vmware import HostContext, VMWare
+    from module_utils.vmware_footprint import Footprint
+    from module_utils.vmware_vm import VM
+
+def measure(footprint, vm):
+    """Returns the footprint of one virtual machine"""
+    if vm.exists() == False:
+        return dict(name= vm.name, failed= True, msg= "VM {} not found".format(vm.name))
+    return dict(name= vm.name, vmx= vm.getPath(), **footprint.vm(vm.getPath()))
+
+def run_module():
+
+    module_args = dict(
+        name=dict(type='str'),
+        names=dict(type='list', elements='str'),
+        pattern=dict(type='str', default='*'),
+        regex=dict(type='bool', default=False),
+        refresh=dict(type='bool', default=False),
+        workers=dict(type='int', default=8)
+    )
+
+    result = dict(
+        changed=False,
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        mutually_exclusive=[
+            ('name', 'names')
+        ],
+        supports_check_mode=True
+    )
+
+    host = HostContext(concurrency= module.params['workers'])
+    footprint = Footprint(VMWare(host), module.params['refresh'])
+    vms = VM.select(host, module.params['name'], module.params['names'], module.params['pattern'], module.params['regex'])
+
+    vmresults = host.executor.gather(*[host.executor.thread(measure, footprint, vm) for vm in vms])
+    vmresults = [dict(name= vm.name, failed= True, msg= str(vmresult)) if isinstance(vmresult, Exception) else vmresult for vm, vmresult in zip(vms, vmresults)]
+    footprint.save()
+
+    measured = [vmresult for vmresult in vmresults if vmresult.get('failed', False) == False]
+    result['vms'] = sorted(measured, key= lambda vmresult: vmresult['bytes'], reverse= True) + [vmresult for vmresult in vmresults if vmresult.get('failed', False)]
+    result['totals'] = footprint.totals(measured)
+    failed = [vmresult['name'] for vmresult in vmresults if vmresult.get('failed', False)]
+    if len(failed) > 0:
+        module.fail_json("Footprint failed for {}".format(', '.join(failed)), **result)
+
+    module.exit_json(**result)
+
+def main():
+    run_module()
+
+if __name__ == '__main__':
+    main()
@@ -102,7 +102,10 @@ def run_module():
     vminfo['wsl'] = vmware.isWsl()
     vminfo['registry'] = vmware.getRegistry()
     vminfo['configfiles'] = vmware.getConfigfiles()
-    vminfo['runningvms'] = vmware.getRunningvms()
+    try:
+        vminfo['runningvms'] = vmware.getRunningvms()
+    except Exception as e:
+        module.fail_json(str(e))
 
     if module.params['inventory']:
         vminfo['inventory'] = vmware.getInventory()
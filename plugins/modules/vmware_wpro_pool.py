@@ -0,0 +1,235 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Eddy Vermoen (@ben-eddy74)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: vmware_wpro_pool
+
+short_description: Pool of pre-created linked clones
+version_added: "1.0.0"
+
+description: This module keeps a number of linked clones of a template snapshot ready, optionally booted and suspended.
+             A claim hands out one of them under a new name by renaming, registering and resuming it,
+             which is much faster than cloning and booting a new virtual machine.
+             The pool is replenished in the background after a claim.
+             The pool state is kept in VMWARE_WPRO_POOL_DIR, which defaults to the pools folder of the cache directory.
+
+options:
+    pool:
+        description: The name of the pool, also used as prefix for the names of its members
+        required: true
+        type: str
+    action:
+        description:
+            - status returns the ready, claimed and failed members
+            - replenish creates members until the pool has size ready members
+            - claim hands out a member as the virtual machine name, and replenishes the pool.
+              When the pool is empty, a linked clone is created instead.
+              A member that fails to boot, suspend or be handed out is deleted, or kept as failed when it can't be deleted
+        type: str
+        choices: status, replenish, claim
+        default: status
+    name:
+        description: The name of the virtual machine to hand out, used by claim
+        type: str
+    template:
+        description: The name of the virtual machine to be cloned
+        type: str
+    snapshot:
+        description: Name of the template VM snapshot to clone
+        type: str
+    size:
+        description: Number of ready members to keep
+        type: int
+        default: 1
+    suspend:
+        description: Start and suspend new members, so a claim resumes them instead of booting
+        type: bool
+        default: true
+    warmup:
+        description: Seconds new members run before they are suspended
+        type: int
+        default: 0
+    background:
+        description: Replenish the pool in a background process, so the module returns immediately
+        type: bool
+        default: true
+    workers:
+        description: Maximum number of members created in parallel
+        type: int
+        default: 4
+
+author:
+    - Eddy Vermoen (@ben-eddy74)
+'''
+
+EXAMPLES = r'''
+- name: Keep 5 booted and suspended CI VMs ready
+  ben_eddy74.vmware_wpro.vmware_wpro_pool:
+    pool: ci
+    action: replenish
+    template: Windows Server 2019
+    snapshot: Base
+    size: 5
+    warmup: 60
+
+- name: Get a VM for this job
+  ben_eddy74.vmware_wpro.vmware_wpro_pool:
+    pool: ci
+    action: claim
+    name: ci-job-{{ job_id }}
+    template: Windows Server 2019
+    snapshot: Base
+    size: 5
+'''
+
+RETURN = r'''
+pool:
+    description: The ready, claimed and failed members of the pool
+    type: dict
+    returned: always
+    sample: '
+        "pool": {
+            "pool": "ci",
+            "size": 5,
+            "ready": ["ci-1f3a9c2e", "ci-8b07d4a1"],
+            "claimed": [],
+            "failed": []
+        }
+    '
+vm:
+    description: The handed out virtual machine, pooled is false when it was cloned because the pool was empty.
+                 discarded tells whether a member that failed to be handed out was deleted
+    type: dict
+    returned: when action is claim
+    sample: '
+        "vm": {
+            "name": "ci-job-1234",
+            "member": "ci-5e2c0f7b",
+            "vmx": "C:\\Users\\admin\\Documents\\Virtual Machines\\ci-5e2c0f7b\\ci-5e2c0f7b.vmx",
+            "changed": true,
+            "pooled": true,
+            "elapsed": 2.87
+        }
+    '
+created:
+    description: Result per created member, when the pool is replenished in the foreground. discarded tells whether a member that failed to boot or suspend was deleted
+    type: list
+    returned: when background is false
+replenisher:
+    description: Process id of the background replenishment, its output is written to replenish.log in the pool folder
+    type: int
+    returned: when background is true
+'''
+
+import os, time
+from ansible.module_utils.basic import AnsibleModule
+try:
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware import HostContext
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_job import detach
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_pool import Pool
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_vm import VM
+except:
+    from module_utils.vmware import HostContext
+    from module_utils.vmware_job import detach
+    from module_utils.vmware_pool import Pool
+    from module_utils.vmware_vm import VM
+
+def pool(params, host):
+    return Pool(params['pool'], params['template'], params['snapshot'], params['size'], params['suspend'], params['warmup'], host)
+
+def replenish(params):
+    """Entry point of the background replenishment, the daemon process gets its own host context"""
+    for created in pool(params, HostContext(concurrency= params['workers'])).replenish():
+        print(time.strftime('%Y-%m-%d %H:%M:%S'), created, flush= True)
+
+def run_module():
+
+    module_args = dict(
+        pool=dict(type='str', required=True),
+        action=dict(type='str', default='status', choices=['status', 'replenish', 'claim']),
+        name=dict(type='str'),
+        template=dict(type='str'),
+        snapshot=dict(type='str', default=''),
+        size=dict(type='int', default=1),
+        suspend=dict(type='bool', default=True),
+        warmup=dict(type='int', default=0),
+        background=dict(type='bool', default=True),
+        workers=dict(type='int', default=4)
+    )
+
+    result = dict(
+        changed=False,
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        required_if=[
+            ('action', 'replenish', ('template',)),
+            ('action', 'claim', ('template', 'name'))
+        ],
+        supports_check_mode=True
+    )
+
+    params = module.params
+    host = HostContext(concurrency= params['workers'])
+    vmpool = pool(params, host)
+
+    if params['action'] == 'claim':
+        vm = VM(params['name'], host)
+        if vm.exists():
+            result['vm'] = dict(name= vm.name, vmx= vm.vmpath, changed= False)
+            result['pool'] = vmpool.status()
+            module.exit_json(**result)
+
+        if module.check_mode:
+            result['changed'] = True
+            result['pool'] = vmpool.status()
+            module.exit_json(**result)
+
+        claimed = host.executor.call(vmpool.claim(vm.name))
+        if claimed != None:
+            claimed['pooled'] = True
+        else:
+            # Empty pool, fall back to a linked clone and a cold boot
+            started = time.monotonic()
+            claimed = dict(name= vm.name, changed= False, pooled= False)
+            msg = VM(params['template'], host).cloneTo(targetname= vm.name, option= 'linked', snapshot= params['snapshot']).strip('\r\n')
+            if msg == '':
+                claimed['changed'] = True
+                msg = VM(vm.name, host).start()
+            if 'Error' in msg:
+                claimed['failed'] = True
+                claimed['msg'] = msg
+            claimed['elapsed'] = round(time.monotonic() - started, 2)
+        result['vm'] = claimed
+        result['changed'] = claimed['changed']
+
+    if params['action'] in ('replenish', 'claim') and module.check_mode == False:
+        if params['background']:
+            result['replenisher'] = detach(replenish, params, logpath= os.path.join(vmpool.directory, 'replenish.log'))
+        else:
+            created = vmpool.replenish()
+            result['created'] = created
+            result['changed'] = result['changed'] or any(member['changed'] for member in created)
+    elif params['action'] == 'replenish':
+        result['changed'] = len(vmpool.members('ready')) < params['size']
+
+    result['pool'] = vmpool.status()
+    if result.get('vm', dict()).get('failed', False):
+        module.fail_json("Claim of {} failed: {}".format(params['name'], result['vm']['msg']), **result)
+    failed = [member['name'] for member in result.get('created', []) if member.get('failed', False)]
+    if len(failed) > 0:
+        module.fail_json("Replenishment failed for {}".format(', '.join(failed)), **result)
+
+    module.exit_json(**result)
+
+def main():
+    run_module()
+
+if __name__ == '__main__':
+    main()
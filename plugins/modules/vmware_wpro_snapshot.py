@@ -17,13 +17,38 @@ description: This module manages snapshots of virtual machines
 options:
     name:
         description: Name of the virtual machine
-        required: true
         type: string
+    names:
+        description: Names of multiple virtual machines, the action is executed on all of them in parallel
+        type: list
+        elements: str
+    workers:
+        description: Maximum number of virtual machines handled in parallel
+        type: int
+        default: 8
+    consistent:
+        description:
+            - Create a crash consistent group snapshot of all virtual machines in names
+            - All running virtual machines are paused, snapshotted in parallel and each one is unpaused as soon as its snapshot is done
+        type: bool
+        default: false
     action:
-        description: Action to execute. Can be list, snapshot, delete, revert
+        description:
+            - Action to execute. Can be list, create, delete, revert or retain
+            - retain deletes all snapshots not kept by keep_newest, keep_pattern or older_than_days,
+              leaves outside of the current snapshot chain first. In check mode only the plan is returned
         required: true
         type: string
         default: list
+    keep_newest:
+        description: With retain, keep the given number of newest snapshots
+        type: int
+    keep_pattern:
+        description: With retain, keep the snapshots with a name matching this glob pattern
+        type: str
+    older_than_days:
+        description: With retain, only delete snapshots older than the given number of days
+        type: int
     snapshot:
         description: Snapshot name
         required: true van action is create, delete or revert
@@ -34,23 +59,207 @@ author:
 '''
 
 EXAMPLES = r'''
+- name: Snapshot the application servers before patching
+  ben_eddy74.vmware_wpro.vmware_wpro_snapshot:
+    names:
+      - nljfc2app
+      - nljfc2sql
+    action: create
+    snapshot: Before patching
+
+- name: Snapshot application and database server at the same point in time
+  ben_eddy74.vmware_wpro.vmware_wpro_snapshot:
+    names:
+      - nljfc2app
+      - nljfc2sql
+    action: create
+    snapshot: Release 2.1
+    consistent: true
+
+- name: Keep the 3 newest snapshots and the baseline
+  ben_eddy74.vmware_wpro.vmware_wpro_snapshot:
+    name: nljfc2app
+    action: retain
+    keep_newest: 3
+    keep_pattern: Baseline*
 '''
 
 RETURN = r'''
+snapshots:
+    description: Names of the snapshots, parents before their children
+    type: list
+    returned: always
+vms:
+    description: Result per virtual machine when names is used
+    type: list
+    returned: when names is used
+    sample: '
+        "vms": [
+            {
+                "name": "nljfc2app",
+                "changed": true,
+                "msg": "",
+                "elapsed": 3.52,
+                "paused": 3.71,
+                "total": "Total snapshots: 1",
+                "snapshots": ["Before patching"]
+            }
+        ]
+    '
+plan:
+    description: With retain, the snapshots to delete in order, with the estimated size of the delta disks to merge
+    type: list
+    returned: when action is retain
+    sample: '
+        "plan": [
+            {
+                "uid": "4",
+                "name": "Test",
+                "path": "Base/Test",
+                "createTime": "2023-05-01T10:12:44.123000+00:00",
+                "current": false,
+                "estimatedMergeBytes": 1073741824
+            }
+        ]
+    '
+tree:
+    description: Snapshot tree read from the .vmsd file of the virtual machine
+    type: list
+    returned: when name is used
+    sample: '
+        "total": "Total snapshots: 2",
+        "snapshots": ["Base", "COTS Installed"],
+        "tree": [
+            {
+                "uid": "1",
+                "name": "Base",
+                "description": "",
+                "parent": null,
+                "createTime": "2023-05-01T10:12:44.123000+00:00",
+                "filename": "nljfc2app-Snapshot1.vmsn",
+                "disks": [
+                    {
+                        "node": "scsi0:0",
+                        "fileName": "nljfc2app.vmdk"
+                    }
+                ],
+                "current": false,
+                "children": [
+                    {
+                        "uid": "2",
+                        "name": "COTS Installed",
+                        "parent": "1",
+                        "current": true,
+                        "children": []
+                    }
+                ]
+            }
+        ]
+    '
 '''
 
-import os
+import time
 from ansible.module_utils.basic import AnsibleModule
 try:
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware import HostContext, VMWare
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_powerstate import PowerState
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_snapshot import groupSnapshot
     from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_vm import VM
 except:
+    from module_utils.vmware import HostContext, VMWare
+    from module_utils.vmware_powerstate import PowerState
+    from module_utils.vmware_snapshot import groupSnapshot
     from module_utils.vmware_vm import VM
 
+async def snapshot(vm, params, check_mode):
+    """Executes the snapshot action on one virtual machine and returns its result"""
+    result = dict(
+        name= vm.name,
+        changed= False,
+    )
+
+    if vm.exists() == False:
+        result['failed'] = True
+        result['msg'] = "VM {} not found".format(vm.name)
+        return result
+
+    # A single read of the snapshot tree for the idempotency checks
+    tree = vm.getSnapshotTree()
+    snapshots = tree.names()
+    action = params['action']
+
+    if action == 'retain':
+        currentdisks = [keys['fileName'] for keys in vm.getDevices().values() if keys.get('fileName', '').casefold().endswith('.vmdk')]
+        plan = tree.retentionPlan(params['keep_newest'], params['keep_pattern'], params['older_than_days'], vm.getDiskSize, currentdisks)
+        result['plan'] = plan
+        result['estimatedMergeBytes'] = sum(step['estimatedMergeBytes'] for step in plan)
+        if check_mode == False:
+            started = time.monotonic()
+            for step in plan:
+                # Deleting a snapshot merges delta disks, so the deletions of one VM run one at a time
+                msg = await vm.executeAsync('deleteSnapshot', '"{}"'.format(step['path']))
+                if 'Error' in msg:
+                    result['failed'] = True
+                    result['msg'] = msg
+                    break
+                result['changed'] = True
+            result['elapsed'] = round(time.monotonic() - started, 2)
+        else:
+            result['changed'] = len(plan) > 0
+
+    commands = dict(create= 'snapshot', delete= 'deleteSnapshot', revert= 'revertToSnapshot')
+
+    if action in commands and (params['snapshot'] in snapshots) == (action != 'create'):
+        if check_mode == False:
+            started = time.monotonic()
+            result['msg'] = await vm.executeAsync(commands[action], '"{}"'.format(params['snapshot']))
+            result['elapsed'] = round(time.monotonic() - started, 2)
+            if 'Error' in result['msg']:
+                result['failed'] = True
+                return result
+        result['changed'] = True
+
+    if result['changed'] and check_mode == False:
+        snapshots = vm.getSnapshotTree().names()
+    result['total'] = 'Total snapshots: {}'.format(len(snapshots))
+    result['snapshots'] = snapshots
+    return result
+
+def grouped(host, vms, module):
+    """Creates the group snapshot for the VMs that don't have it yet"""
+    missing = [vm.name for vm in vms if vm.exists() == False]
+    if len(missing) > 0:
+        module.fail_json("VM {} not found".format(', '.join(missing)))
+
+    vmresults = dict()
+    members = []
+    for vm in vms:
+        if module.params['snapshot'] in vm.getSnapshotTree().names():
+            vmresults[vm.name] = dict(name= vm.name, changed= False, msg= "Snapshot already exists")
+        else:
+            members.append(vm)
+            vmresults[vm.name] = dict(name= vm.name, changed= True)
+
+    if module.check_mode == False and len(members) > 0:
+        try:
+            states = PowerState(VMWare(host)).evaluate(members)
+        except Exception as e:
+            module.fail_json(str(e))
+        for vmresult in host.executor.call(groupSnapshot(members, module.params['snapshot'], states)):
+            vmresults[vmresult['name']] = vmresult
+    return [vmresults[vm.name] for vm in vms]
+
 def run_module():
 
     module_args = dict(
-        name=dict(type='str', required=True),
-        action=dict(type='str', default="list", choices=["list", "create", "delete", "revert"]),
+        name=dict(type='str'),
+        names=dict(type='list', elements='str'),
+        workers=dict(type='int', default=8),
+        consistent=dict(type='bool', default=False),
+        action=dict(type='str', default="list", choices=["list", "create", "delete", "revert", "retain"]),
+        keep_newest=dict(type='int'),
+        keep_pattern=dict(type='str'),
+        older_than_days=dict(type='int'),
         snapshot=dict(type='str', required=False) #TODO: required when action is "create", "delete", "revert"
     )
 
@@ -62,44 +271,57 @@ def run_module():
     module = AnsibleModule(
         argument_spec=module_args,
         supports_check_mode=True,
+        mutually_exclusive=[
+            ('name', 'names')
+        ],
+        required_one_of=[
+            ('name', 'names')
+        ],
         required_if=[
+            ('consistent', True, ('names',)),
             ('action', 'create', (['snapshot'])),
             ('action', 'delete', (['snapshot'])),
-            ('action', 'revert', (['snapshot']))
+            ('action', 'revert', (['snapshot'])),
+            ('action', 'retain', ('keep_newest', 'keep_pattern', 'older_than_days'), True)
         ]
     )
 
-    vm = VM(module.params['name'])
-    snapshots = vm.getSnapshots().split(os.linesep)
-
-    total_snapshots = snapshots.pop(0)
-    result['total'] = total_snapshots
-    result['snapshots'] = snapshots
-
-    action = module.params['action']
+    names = module.params['names'] if module.params['names'] != None else [module.params['name']]
+    workers = module.params['workers']
+    if module.params['consistent'] and module.params['action'] == 'create':
+        # Every member of a group snapshot needs its own slot in the executor, otherwise VMs stay paused while waiting
+        workers = max(workers, len(names))
+    host = HostContext(concurrency= workers)
+    vms = [VM(name, host) for name in names]
 
-    if action == 'create' and module.params['snapshot'] in snapshots:
+    if module.params['consistent'] and module.params['action'] == 'create':
+        result.pop('snapshots')
+        result['vms'] = grouped(host, vms, module)
+        result['changed'] = any(vmresult['changed'] for vmresult in result['vms'])
+        failed = [vmresult['name'] for vmresult in result['vms'] if vmresult.get('failed', False)]
+        if len(failed) > 0:
+            module.fail_json("Group snapshot failed for {}".format(', '.join(failed)), **result)
         module.exit_json(**result)
-    
-    if module.check_mode or action == 'list':
-        module.exit_json(**result)
-
-    if action == 'create':
-        vm.createSnapshot('"{}"'.format(module.params['snapshot']))
-        result['changed'] = True
 
-    if action == 'delete' and module.params['snapshot'] in snapshots:
-        vm.deleteSnapshot('"{}"'.format(module.params['snapshot']))
-        result['changed'] = True
+    vmresults = host.executor.gather(*[snapshot(vm, module.params, module.check_mode) for vm in vms])
+    vmresults = [dict(name= vm.name, changed= False, failed= True, msg= str(vmresult)) if isinstance(vmresult, Exception) else vmresult for vm, vmresult in zip(vms, vmresults)]
 
-    if action == 'revert' and module.params['snapshot'] in snapshots:
-        vm.revertSnapshot('"{}"'.format(module.params['snapshot']))
-        result['changed'] = True
+    if module.params['name'] != None:
+        vmresult = vmresults[0]
+        vmresult.pop('name')
+        failed = vmresult.pop('failed', False)
+        result.update(vmresult)
+        if failed:
+            module.fail_json(**result)
+        result['tree'] = vms[0].getSnapshotTree().totree()
+        module.exit_json(**result)
 
-    snapshots = vm.getSnapshots().split(os.linesep)
-    total_snapshots = snapshots.pop(0)
-    result['total'] = total_snapshots
-    result['snapshots'] = snapshots
+    result.pop('snapshots')
+    result['vms'] = vmresults
+    result['changed'] = any(vmresult['changed'] for vmresult in vmresults)
+    failed = [vmresult['name'] for vmresult in vmresults if vmresult.get('failed', False)]
+    if len(failed) > 0:
+        module.fail_json("Snapshot {} failed for {}".format(module.params['action'], ', '.join(failed)), **result)
 
     module.exit_json(**result)
 
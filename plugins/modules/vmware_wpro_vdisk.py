@@ -17,8 +17,11 @@ description: This module manages virtual disks
 options:
     vmdk:
         description: The path of the virtual disk file
-        required: true
         type: str
+    vmdks:
+        description: The paths of multiple virtual disk files, processed concurrently by cmd
+        type: list
+        elements: str
     create:
         description: Create a new virtual disk
         type: dict
@@ -41,38 +44,298 @@ options:
                     2: preallocated virtual disk
                     3: preallocated virtual disk split into multiple files
                 default: 0
+    disks:
+        description:
+            - Virtual disks to create concurrently, disks that already exist are skipped
+            - At most preallocate_concurrency preallocated disks (disktype 2 and 3) are created at the same time on the same volume
+        type: list
+        elements: dict
+        options:
+            vmdk:
+                description: The path of the virtual disk file
+                type: str
+                required: true
+            size:
+                description: Disk size, for example 500MB or 16GB
+                type: str
+                required: true
+            adapter:
+                description: Adapter type
+                type: str
+                choices: ide, buslogic, lsilogic
+                default: lsilogic
+            disktype:
+                description: Specifies the disk type, see create
+                type: int
+                choices: 0, 1, 2, 3
+                default: 0
+    preallocate_concurrency:
+        description: Maximum number of preallocated disks created at the same time on the same volume
+        type: int
+        default: 1
     cmd:
         description: Speficies disk operation
         type: str
         choices: defragment, shrink
+    threshold:
+        description:
+            - Only run cmd when its estimated gain in percent reaches the threshold
+            - For shrink the gain is the reclaimable part of the disk files, for defragment the fragmentation of the allocated grains
+            - The estimate is read from the grain tables of the sparse extents and is returned either way
+        type: float
+    scan_zero:
+        description: Also read the allocated grains to count grains containing only zeros as reclaimable by shrink
+        type: bool
+        default: false
+    job:
+        description:
+            - Run cmd as a background job, which is not bound to the timeouts of the task
+            - start launches the job, poll returns its state, wait polls until the job has ended and cancel stops it
+            - The job state and output are stored in the jobs folder of the cache directory
+        type: str
+        choices: start, poll, wait, cancel
+    io_concurrency:
+        description: Maximum number of disks processed or created at the same time, also across background jobs started by other tasks
+        type: int
+        default: 2
+    wait_timeout:
+        description: Maximum number of seconds to wait for the jobs with job wait
+        type: int
+        default: 3600
 
 author:
     - Eddy Vermoen (@ben-eddy74)
 '''
 
 EXAMPLES = r'''
+- name: Shrink the disks of the lab in the background
+  ben_eddy74.vmware_wpro.vmware_wpro_vdisk:
+    vmdks:
+      - c:\vms\lab-01\lab-01.vmdk
+      - c:\vms\lab-02\lab-02.vmdk
+    cmd: shrink
+    job: start
+
+- name: Create the data disks of the lab
+  ben_eddy74.vmware_wpro.vmware_wpro_vdisk:
+    disks:
+      - vmdk: c:\vms\lab-01\data.vmdk
+        size: 100GB
+        disktype: 2
+      - vmdk: d:\vms\lab-02\data.vmdk
+        size: 100GB
+        disktype: 2
+      - vmdk: c:\vms\lab-01\logs.vmdk
+        size: 20GB
+
+- name: Shrink only when at least 10% of the disk files can be reclaimed
+  ben_eddy74.vmware_wpro.vmware_wpro_vdisk:
+    vmdk: c:\vms\lab-01\lab-01.vmdk
+    cmd: shrink
+    threshold: 10
+    scan_zero: true
+
+- name: Wait for the shrink jobs
+  ben_eddy74.vmware_wpro.vmware_wpro_vdisk:
+    vmdks:
+      - c:\vms\lab-01\lab-01.vmdk
+      - c:\vms\lab-02\lab-02.vmdk
+    job: wait
 '''
 
 RETURN = r'''
+job:
+    description: State of the background job of the disk
+    type: dict
+    returned: when job is used with vmdk
+    sample: '
+        "job": {
+            "id": "vdisk-5f0c6a3d9e2b7a41",
+            "name": "c:\\vms\\lab-01\\lab-01.vmdk",
+            "operation": "shrink",
+            "status": "running",
+            "progress": 45,
+            "pid": 2817,
+            "rc": null,
+            "started": 1697616000.12,
+            "finished": null,
+            "log": "/home/user/.cache/vmware_wpro/jobs/vdisk-5f0c6a3d9e2b7a41.log",
+            "output": "Shrink: 45% done."
+        }
+    '
+estimate:
+    description: Estimated gain of shrink and defragment, sizes are in bytes and gains in percent
+    type: dict
+    returned: when cmd is used
+    sample: '
+        "estimate": {
+            "capacity": 64424509440,
+            "allocatedBytes": 21474836480,
+            "allocatedPercent": 33.33,
+            "fileBytes": 22548578304,
+            "reclaimableBytes": 1073741824,
+            "shrinkGain": 4.76,
+            "fragmentation": 12.5,
+            "scanned": false,
+            "extents": [
+                {
+                    "path": "c:\\vms\\lab-01\\lab-01.vmdk",
+                    "grains": 983040,
+                    "allocatedGrains": 327680,
+                    "zeroGrains": 0,
+                    "allocatedBytes": 21474836480,
+                    "fileBytes": 22548578304,
+                    "slackBytes": 1073741824,
+                    "breaks": 40960
+                }
+            ]
+        }
+    '
+vdisks:
+    description: Result per disk when vmdks or disks is used
+    type: list
+    returned: when vmdks or disks is used
+    sample: '
+        "vdisks": [
+            {
+                "vmdk": "c:\\vms\\lab-01\\data.vmdk",
+                "changed": true,
+                "exists": false,
+                "vdisk": "Creating disk ...\nVirtual disk creation successful.",
+                "elapsed": 187.32
+            }
+        ]
+    '
 '''
 
+import asyncio, time
 from ansible.module_utils.basic import AnsibleModule
 try:
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware import HostContext
     from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_vdisk import VDisk
 except:
+    from module_utils.vmware import HostContext
     from module_utils.vmware_vdisk import VDisk
 
+SUCCESS = dict(shrink= 'Shrink completed successfully.', defragment= 'Defragmentation completed successfully.')
+
+def estimate(vdisk, cmd, params):
+    """Returns the estimate of the disk, and the reason to skip cmd or None when cmd should run"""
+    try:
+        result = vdisk.estimate(params['scan_zero'])
+    except (OSError, ValueError) as e:
+        return dict(error= str(e)), None
+    gain = result['shrinkGain'] if cmd == 'shrink' else result['fragmentation']
+    # Without estimated sparse extents there is nothing to compare, so cmd runs
+    if params['threshold'] == None or result['fileBytes'] == 0 or gain >= params['threshold']:
+        return result, None
+    return result, 'Skipped: estimated {0} gain of {1}% is below the threshold of {2}%'.format(cmd, gain, params['threshold'])
+
+async def operate(vdisk, params):
+    """Runs cmd on one virtual disk in the foreground and returns its result"""
+    cmd = params['cmd']
+    result = dict(vmdk= vdisk.vmdk, changed= False, exists= vdisk.exists())
+    result['estimate'], skipped = await vdisk.host.executor.thread(estimate, vdisk, cmd, params)
+    if skipped != None:
+        result['vdisk'] = skipped
+        return result
+    started = time.monotonic()
+    result['vdisk'] = await (vdisk.shrinkAsync() if cmd == 'shrink' else vdisk.defragmentAsync())
+    result['elapsed'] = round(time.monotonic() - started, 2)
+    result['changed'] = SUCCESS[cmd] in result['vdisk']
+    result['failed'] = 'Failed' in result['vdisk']
+    return result
+
+async def create(vdisk, spec, exists, volumes, check_mode):
+    """Creates one virtual disk of the batch and returns its result"""
+    result = dict(vmdk= vdisk.vmdk, changed= False, exists= exists)
+    if exists:
+        return result
+    if check_mode:
+        result['changed'] = True
+        return result
+
+    # Preallocation writes the whole disk, so these are limited per volume
+    volume = volumes[vdisk.getVolume()] if spec['disktype'] in (2, 3) else None
+    if volume != None:
+        await volume.acquire()
+    try:
+        started = time.monotonic()
+        result['vdisk'] = await vdisk.createAsync(size= spec['size'], adaptertype= spec['adapter'], disktype= spec['disktype'])
+        result['elapsed'] = round(time.monotonic() - started, 2)
+    finally:
+        if volume != None:
+            volume.release()
+    result['changed'] = 'Virtual disk creation successful' in result['vdisk']
+    result['failed'] = 'Failed' in result['vdisk'] or result['changed'] == False
+    return result
+
+async def batch(vdisks, specs, params, check_mode):
+    # Existence is checked for all disks before any disk is created
+    exists = [vdisk.exists() for vdisk in vdisks]
+    volumes = dict((vdisk.getVolume(), asyncio.Semaphore(params['preallocate_concurrency'])) for vdisk in vdisks)
+    return await asyncio.gather(*[create(vdisk, spec, exist, volumes, check_mode) for vdisk, spec, exist in zip(vdisks, specs, exists)], return_exceptions= True)
+
+def job(vdisk, params, check_mode):
+    """Starts, polls or cancels the background job of one virtual disk and returns its result"""
+    result = dict(vmdk= vdisk.vmdk, changed= False, exists= vdisk.exists())
+    state = vdisk.getJob().load()
+    running = state != None and state['status'] in ('queued', 'running')
+
+    if params['job'] == 'start' and running == False:
+        if result['exists'] == False:
+            result['failed'] = True
+            result['msg'] = "Virtual disk {} not found".format(vdisk.vmdk)
+            return result
+        result['estimate'], skipped = estimate(vdisk, params['cmd'], params)
+        if skipped != None:
+            result['vdisk'] = skipped
+            result['job'] = state
+            return result
+        result['changed'] = True
+        if check_mode == False:
+            state = vdisk.startJob(params['cmd'], params['io_concurrency'])
+    elif params['job'] == 'cancel' and running:
+        result['changed'] = True
+        if check_mode == False:
+            state = vdisk.getJob().cancel()
+
+    result['job'] = state
+    return result
+
+def finish(result):
+    # A failed job fails the task once it is reported
+    state = result.get('job')
+    if state != None and state['status'] == 'failed':
+        result['failed'] = True
+        result['msg'] = state.get('output', '') or state.get('msg', 'Job failed')
+    return result
+
 def run_module():
 
     module_args = dict(
-        vmdk=dict(type='str', required=True),
+        vmdk=dict(type='str'),
+        vmdks=dict(type='list', elements='str'),
         create=dict(type='dict', options=dict(
             adapter=dict(type='str', choices=["ide", "buslogic", "lsilogic"], default='lsilogic'),
             size=dict(type='str', required=True),
             disktype=dict(type='int', choices=[0,1,2,3], default= 0)
             )
         ),
+        disks=dict(type='list', elements='dict', options=dict(
+            vmdk=dict(type='str', required=True),
+            size=dict(type='str', required=True),
+            adapter=dict(type='str', choices=["ide", "buslogic", "lsilogic"], default='lsilogic'),
+            disktype=dict(type='int', choices=[0,1,2,3], default= 0)
+            )
+        ),
+        preallocate_concurrency=dict(type='int', default=1),
         cmd=dict(type='str', choices=["defragment", "shrink"]),
+        threshold=dict(type='float'),
+        scan_zero=dict(type='bool', default=False),
+        job=dict(type='str', choices=["start", "poll", "wait", "cancel"]),
+        io_concurrency=dict(type='int', default=2),
+        wait_timeout=dict(type='int', default=3600),
     )
 
     result = dict(
@@ -82,14 +345,79 @@ def run_module():
     module = AnsibleModule(
         argument_spec=module_args,
         mutually_exclusive=[
-            ("create", "cmd")
+            ("create", "cmd"),
+            ("create", "job"),
+            ("create", "vmdks"),
+            ("vmdk", "vmdks", "disks"),
+            ("disks", "create"),
+            ("disks", "cmd"),
+            ("disks", "job")
+        ],
+        required_one_of=[
+            ("vmdk", "vmdks", "disks")
+        ],
+        required_if=[
+            ("job", "start", ("cmd",))
         ],
         supports_check_mode=True
     )
 
+    if module.params['disks'] != None:
+        host = HostContext(concurrency= module.params['io_concurrency'])
+        vdisks = [VDisk(spec['vmdk'], host) for spec in module.params['disks']]
+        vdiskresults = host.executor.call(batch(vdisks, module.params['disks'], module.params, module.check_mode))
+        vdiskresults = [dict(vmdk= vdisk.vmdk, changed= False, failed= True, vdisk= str(vdiskresult)) if isinstance(vdiskresult, Exception) else vdiskresult for vdisk, vdiskresult in zip(vdisks, vdiskresults)]
+
+        result['vdisks'] = vdiskresults
+        result['changed'] = any(vdiskresult['changed'] for vdiskresult in vdiskresults)
+        failed = [vdiskresult['vmdk'] for vdiskresult in vdiskresults if vdiskresult.get('failed', False)]
+        if len(failed) > 0:
+            module.fail_json("Creation failed for {}".format(', '.join(failed)), **result)
+        module.exit_json(**result)
+
+    if module.params['vmdks'] != None or module.params['job'] != None:
+        host = HostContext(concurrency= module.params['io_concurrency'])
+        vdisks = [VDisk(vmdk, host) for vmdk in (module.params['vmdks'] or [module.params['vmdk']])]
+
+        if module.params['job'] != None:
+            vdiskresults = [job(vdisk, module.params, module.check_mode) for vdisk in vdisks]
+            if module.params['job'] == 'wait' and module.check_mode == False:
+                deadline = time.monotonic() + module.params['wait_timeout']
+                while time.monotonic() < deadline and any(vdisk.getJob().running() for vdisk in vdisks):
+                    time.sleep(2)
+                for vdiskresult, vdisk in zip(vdiskresults, vdisks):
+                    vdiskresult['job'] = vdisk.getJob().load()
+            vdiskresults = [finish(vdiskresult) for vdiskresult in vdiskresults]
+        elif module.params['cmd'] != None:
+            if module.check_mode:
+                module.exit_json(vdisks= [dict(vmdk= vdisk.vmdk, changed= False, exists= vdisk.exists()) for vdisk in vdisks], **result)
+            vdiskresults = host.executor.gather(*[operate(vdisk, module.params) for vdisk in vdisks])
+            vdiskresults = [dict(vmdk= vdisk.vmdk, changed= False, failed= True, vdisk= str(vdiskresult)) if isinstance(vdiskresult, Exception) else vdiskresult for vdisk, vdiskresult in zip(vdisks, vdiskresults)]
+        else:
+            module.fail_json("vmdks requires cmd or job")
+
+        if module.params['vmdks'] == None:
+            result.update(vdiskresults[0])
+            result.pop('vmdk')
+        else:
+            result['vdisks'] = vdiskresults
+            result['changed'] = any(vdiskresult['changed'] for vdiskresult in vdiskresults)
+        failed = [vdiskresult['vmdk'] for vdiskresult in vdiskresults if vdiskresult.get('failed', False)]
+        if len(failed) > 0:
+            msg = result.pop('msg', None) if module.params['vmdks'] == None else None
+            result.pop('failed', None)
+            module.fail_json(msg or "Failed for {}".format(', '.join(failed)), **result)
+        module.exit_json(**result)
+
     vdisk = VDisk(module.params["vmdk"])
     result['exists'] = vdisk.exists()
 
+    if module.params['cmd'] != None:
+        result['estimate'], skipped = estimate(vdisk, module.params['cmd'], module.params)
+        if skipped != None:
+            result['vdisk'] = skipped
+            module.exit_json(**result)
+
     if module.check_mode:
         module.exit_json(**result)
 
@@ -0,0 +1,171 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Eddy Vermoen (@ben-eddy74)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: vmware_wpro_vdisk_info
+
+short_description: Virtual disk information
+version_added: "1.0.0"
+
+description: This module returns the facts of virtual disks, read from the VMDK descriptor and the headers of the sparse extents.
+             No VMware tools are started, so many disks can be inspected in parallel.
+
+options:
+    vmdk:
+        description: The path of the virtual disk file
+        type: str
+    vmdks:
+        description: The paths of multiple virtual disk files
+        type: list
+        elements: str
+    parents:
+        description: Include the parent chain of delta disks
+        type: bool
+        default: true
+    workers:
+        description: Maximum number of disks inspected in parallel
+        type: int
+        default: 8
+
+author:
+    - Eddy Vermoen (@ben-eddy74)
+'''
+
+EXAMPLES = r'''
+- name: Get the facts of the disks of a linked clone
+  ben_eddy74.vmware_wpro.vmware_wpro_vdisk_info:
+    vmdks:
+      - c:\vms\ci-01\ci-01-000001.vmdk
+      - c:\vms\ci-01\data.vmdk
+'''
+
+RETURN = r'''
+vdisk:
+    description: The facts of the disk, sizes are in bytes
+    type: dict
+    returned: when vmdk is used
+    sample: '
+        "vdisk": {
+            "path": "c:\\vms\\ci-01\\ci-01-000001.vmdk",
+            "capacity": 64424509440,
+            "allocated": 4325376,
+            "adapter": "lsilogic",
+            "createType": "monolithicSparse",
+            "CID": "8e2ea6b1",
+            "parentCID": "5c6b91a0",
+            "parentFileNameHint": "C:\\vms\\Tpl\\Tpl.vmdk",
+            "virtualHWVersion": "19",
+            "extents": [
+                {
+                    "access": "RW",
+                    "sectors": 125829120,
+                    "type": "SPARSE",
+                    "file": "ci-01-000001.vmdk",
+                    "offset": 0,
+                    "path": "c:\\vms\\ci-01\\ci-01-000001.vmdk",
+                    "allocated": 4325376,
+                    "header": {
+                        "magic": 1447904331,
+                        "version": 1,
+                        "flags": 3,
+                        "capacity": 125829120,
+                        "grainSize": 128,
+                        "descriptorOffset": 1,
+                        "descriptorSize": 20,
+                        "numGTEsPerGT": 512,
+                        "rgdOffset": 21,
+                        "gdOffset": 8213,
+                        "overHead": 16512,
+                        "uncleanShutdown": 0,
+                        "compressAlgorithm": 0
+                    }
+                }
+            ],
+            "missing": [],
+            "chain": [
+                {
+                    "path": "C:\\vms\\Tpl\\Tpl.vmdk",
+                    "CID": "5c6b91a0",
+                    "parentCID": "ffffffff",
+                    "createType": "twoGbMaxExtentSparse",
+                    "consistent": true
+                }
+            ]
+        }
+    '
+vdisks:
+    description: The facts per disk when vmdks is used
+    type: list
+    returned: when vmdks is used
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+try:
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware import HostContext
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_vdisk import VDisk
+except:
+    from module_utils.vmware import HostContext
+    from module_utils.vmware_vdisk import VDisk
+
+def inspect(vdisk, parents):
+    """Returns the facts of one virtual disk"""
+    if vdisk.exists() == False:
+        return dict(path= vdisk.vmdk, failed= True, msg= "Virtual disk {} not found".format(vdisk.vmdk))
+    try:
+        return vdisk.info(parents)
+    except (OSError, ValueError) as e:
+        return dict(path= vdisk.vmdk, failed= True, msg= str(e))
+
+def run_module():
+
+    module_args = dict(
+        vmdk=dict(type='str'),
+        vmdks=dict(type='list', elements='str'),
+        parents=dict(type='bool', default=True),
+        workers=dict(type='int', default=8)
+    )
+
+    result = dict(
+        changed=False,
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        mutually_exclusive=[
+            ('vmdk', 'vmdks')
+        ],
+        required_one_of=[
+            ('vmdk', 'vmdks')
+        ],
+        supports_check_mode=True
+    )
+
+    vmdks = module.params['vmdks'] if module.params['vmdks'] != None else [module.params['vmdk']]
+    host = HostContext(concurrency= module.params['workers'])
+    vdisks = [VDisk(vmdk, host) for vmdk in vmdks]
+
+    vdiskresults = host.executor.gather(*[host.executor.thread(inspect, vdisk, module.params['parents']) for vdisk in vdisks])
+    vdiskresults = [dict(path= vdisk.vmdk, failed= True, msg= str(vdiskresult)) if isinstance(vdiskresult, Exception) else vdiskresult for vdisk, vdiskresult in zip(vdisks, vdiskresults)]
+
+    failed = [vdiskresult['path'] for vdiskresult in vdiskresults if vdiskresult.get('failed', False)]
+    if module.params['vmdks'] == None:
+        result['vdisk'] = vdiskresults[0]
+        if len(failed) > 0:
+            module.fail_json(vdiskresults[0]['msg'], **result)
+    else:
+        result['vdisks'] = vdiskresults
+        if len(failed) > 0:
+            module.fail_json("Inspection failed for {}".format(', '.join(failed)), **result)
+
+    module.exit_json(**result)
+
+def main():
+    run_module()
+
+if __name__ == '__main__':
+    main()
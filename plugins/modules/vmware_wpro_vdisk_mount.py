@@ -21,16 +21,37 @@ options:
         type: str
     vmdk:
         description: The path of the virtual disk file
-        required: true
         type: str
     devicehost:
         description: Set the device host, for example sata0:1
-        required: true
         type: str
     present:
         description: Present the disk to the GUI and to the virtual machine
         type: bool
         default: true
+    devices:
+        description: Mount multiple virtual disks with a single vmx update, instead of vmdk and devicehost
+        type: list
+        elements: dict
+        options:
+            vmdk:
+                description: The path of the virtual disk file
+                required: true
+                type: str
+            devicehost:
+                description: Set the device host, for example sata0:1
+                required: true
+                type: str
+            present:
+                description: Present the disk to the GUI and to the virtual machine
+                type: bool
+                default: true
+    exclusive:
+        description:
+            - Detach all virtual disks of the virtual machine that are not listed
+            - The boot disk at device host 0:0 of the first controller, for example sata0:0, is only detached when it is listed
+        type: bool
+        default: false
 
 author:
     - Eddy Vermoen (@ben-eddy74)
@@ -42,12 +63,34 @@ EXAMPLES = r'''
     name: my virtual machine
     vmdk: c:\\vmware\\my virtual machine\\disk_d.vmdk
     devicehost: nvme0:1
+
+- name: Mount the data disks
+  ben_eddy74.vmware_wpro.vmware_wpro_vdisk_mount:
+    name: my virtual machine
+    devices:
+      - vmdk: c:\\vmware\\my virtual machine\\disk_d.vmdk
+        devicehost: nvme0:1
+      - vmdk: c:\\vmware\\my virtual machine\\disk_e.vmdk
+        devicehost: nvme0:2
 '''
 
 RETURN = r'''
-
+changes:
+    description: The changed vmx keys, after is null for removed keys
+    type: dict
+    returned: always
+    sample: '
+        "changed": true,
+        "changes": {
+            "nvme0:2.fileName": {
+                "before": null,
+                "after": "c:\\vmware\\my virtual machine\\disk_e.vmdk"
+            }
+        }
+    '
 '''
 
+import re
 from ansible.module_utils.basic import AnsibleModule
 try:
     from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_vm import VM
@@ -58,9 +101,16 @@ def run_module():
 
     module_args = dict(
         name=dict(type='str', required=True),
-        vmdk=dict(type='str', required=True),
-        devicehost=dict(type='str', required=True),
-        present=dict(type='bool', default=True)
+        vmdk=dict(type='str'),
+        devicehost=dict(type='str'),
+        present=dict(type='bool', default=True),
+        devices=dict(type='list', elements='dict', options=dict(
+            vmdk=dict(type='str', required=True),
+            devicehost=dict(type='str', required=True),
+            present=dict(type='bool', default=True)
+            )
+        ),
+        exclusive=dict(type='bool', default=False)
     )
 
     result = dict(
@@ -69,6 +119,16 @@ def run_module():
 
     module = AnsibleModule(
         argument_spec=module_args,
+        mutually_exclusive=[
+            ('devices', 'vmdk'),
+            ('devices', 'devicehost')
+        ],
+        required_one_of=[
+            ('devices', 'devicehost')
+        ],
+        required_together=[
+            ('vmdk', 'devicehost')
+        ],
         supports_check_mode=True
     )
 
@@ -77,27 +137,34 @@ def run_module():
     if vm.exists() == False:
         module.fail_json("VM {} not found".format(module.params['name']))
 
+    devices = module.params['devices']
+    if devices == None:
+        devices = [dict((k, module.params[k]) for k in ('vmdk', 'devicehost', 'present'))]
+
+    devicehosts = [device['devicehost'].casefold() for device in devices]
+    for device in devices:
+        if re.match(r'^(ide|scsi|sata|nvme)\d+:\d+$', device['devicehost'], re.IGNORECASE) == None:
+            module.fail_json("Invalid device host {}".format(device['devicehost']))
+        if devicehosts.count(device['devicehost'].casefold()) > 1:
+            module.fail_json("Device host {} is used more than once".format(device['devicehost']))
+
     config = dict()
-    config[module.params['devicehost'] + '.fileName'] = module.params['vmdk']
-    config[module.params['devicehost'] + '.present'] = "TRUE" if module.params['present'] else "FALSE"
-    
-    currentconfig = vm.facts()["config"]
-
-    for k, v in config.items():
-        if k in currentconfig:
-            if currentconfig[k] != v:
-                currentconfig[k] = v
-                result['changed'] = True
-        else:
-            currentconfig[k] = v
-            result['changed'] = True
-
-    if module.check_mode:
-        module.exit_json(**result)
-
-    if result['changed']:
-        vm.setVmxConfig(config)
-    
+    for device in devices:
+        config[device['devicehost'] + '.fileName'] = device['vmdk']
+        config[device['devicehost'] + '.present'] = "TRUE" if device['present'] else "FALSE"
+
+    remove = []
+    if module.params['exclusive']:
+        for devicehost, keys in vm.getDevices().items():
+            isdisk = keys.get('fileName', '').casefold().endswith('.vmdk') and 'cdrom' not in keys.get('deviceType', '').casefold()
+            # The boot disk is kept unless its device host is listed explicitly
+            isboot = re.match(r'^[a-z]+0:0$', devicehost) != None
+            if devicehost not in devicehosts and isdisk and isboot == False:
+                remove += [devicehost + '.' + k for k in keys.keys()]
+
+    result['changes'] = vm.setVmxConfig(config, remove, dryrun= module.check_mode)
+    result['changed'] = len(result['changes']) > 0
+
     module.exit_json(**result)
 
 def main():
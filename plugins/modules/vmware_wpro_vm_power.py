@@ -17,15 +17,29 @@ description: This module contains power commands
 options:
     name:
         description: The name of the virtual machine
-        required: true
         type: str
+    names:
+        description: The names of multiple virtual machines, their transitions are executed in parallel
+        type: list
+        elements: str
+    pattern:
+        description: Select all virtual machines of the inventory with a name matching this glob pattern
+        type: str
+    regex:
+        description: Interpret pattern as a regular expression instead of a glob pattern
+        type: bool
+        default: false
+    workers:
+        description: Maximum number of virtual machines transitioned in parallel
+        type: int
+        default: 8
     state:
         description:
             - If C(started), the virtual machine will be started
-            - If C(stopped), the virtual machine will be stoppped
+            - If C(stopped), the virtual machine will be stoppped, a suspended virtual machine is left suspended
             - If C(reset), the virtual machine will be reset
             - If C(paused), the virtual machine will be paused
-            - If C(unpaused), the virtual machine will be unpaused
+            - If C(unpaused), the virtual machine will be unpaused, a started or suspended virtual machine is left as is
         required: true
         type: str
     parameter:
@@ -48,6 +62,11 @@ EXAMPLES = r'''
     name: My Windows Server
     state: stopped
     parameter: hard
+
+- name: Start all lab VMs
+  ben_eddy74.vmware_wpro.vmware_wpro_vm_power:
+    pattern: lab-*
+    state: started
 '''
 
 RETURN = r'''
@@ -68,70 +87,145 @@ vm:
             }
         }
     '
+before:
+    description: The power state before the transition, one of started, stopped, paused or suspended
+    type: str
+    returned: when the virtual machine exists
+after:
+    description: The expected state
+    type: str
+    returned: when the virtual machine exists
+vms:
+    description: Result per virtual machine when names or pattern is used
+    type: list
+    returned: when names or pattern is used
+    sample: '
+        "changed": true,
+        "vms": [
+            {
+                "name": "lab-01",
+                "changed": true,
+                "before": "stopped",
+                "after": "started",
+                "msg": ""
+            }
+        ]
+    '
 '''
 
 from ansible.module_utils.basic import AnsibleModule
 try:
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware import HostContext, VMWare
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_powerstate import PowerState
     from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_vm import VM
 except:
+    from module_utils.vmware import HostContext, VMWare
+    from module_utils.vmware_powerstate import PowerState
     from module_utils.vmware_vm import VM
 
-def run_module():
-
-    module_args = dict(
-        name=dict(type='str', required=True),
-        state=dict(type='str', required=True, choices=['started', 'stopped', 'reset', 'paused','unpaused']),
-        startwith=dict(type='str', choices=['gui', 'nogui'], default='nogui'),
-        force=dict(type='bool', default= False)
-    )
-
+async def power(vm, current_state, params, check_mode):
+    """Brings one virtual machine into the expected state and returns its result"""
     result = dict(
-        changed=False,
-    )
-
-    module = AnsibleModule(
-        argument_spec=module_args,
-        supports_check_mode=True
+        name= vm.name,
+        changed= False,
     )
 
-    vm = VM(module.params['name'])
-
     if vm.exists() == False:
-        module.fail_json("VM {} not found".format(module.params['name']))
+        result['failed'] = True
+        result['msg'] = "VM {} not found".format(vm.name)
+        return result
 
-    expected_state = module.params['state'].casefold()
-    current_state = vm.getPowerState()
-    forced = 'hard' if module.params['force'] == True else 'soft'
+    expected_state = params['state'].casefold()
+    forced = 'hard' if params['force'] == True else 'soft'
 
     result['before'] = current_state
     result['after'] = expected_state
 
-    if module.check_mode:
-        result['changed'] = (expected_state != current_state)
-        module.exit_json(**result)
+    # A suspended VM isn't running, it is already stopped and not paused
+    if (expected_state, current_state) in (('stopped', 'suspended'), ('unpaused', 'started'), ('unpaused', 'suspended')):
+        return result
 
-    if current_state == 'started' and expected_state == 'unpaused':
-        module.exit_json(**result)
+    if check_mode:
+        result['changed'] = (expected_state != current_state)
+        return result
 
     if current_state != expected_state:
         if expected_state == 'started':
-            result['msg'] = vm.start(module.params['startwith']).strip('\r\n')
+            result['msg'] = (await vm.executeAsync('start', params['startwith'])).strip('\r\n')
         elif expected_state == 'stopped':
-            result['msg'] = vm.stop(forced).strip('\r\n')
+            result['msg'] = (await vm.executeAsync('stop', forced)).strip('\r\n')
         elif expected_state == 'reset':
-            result['msg'] = vm.reset(forced).strip('\r\n')
+            result['msg'] = (await vm.executeAsync('reset', forced)).strip('\r\n')
         elif expected_state == 'paused':
-            result['msg'] = vm.pause().strip('\r\n')
+            result['msg'] = (await vm.executeAsync('pause')).strip('\r\n')
         elif expected_state == 'unpaused':
-            result['msg'] = vm.unpause().strip('\r\n')
+            result['msg'] = (await vm.executeAsync('unpause')).strip('\r\n')
         else:
-            module.fail_json("Unkown state")
-        
+            result['failed'] = True
+            result['msg'] = "Unkown state"
+            return result
+
         if "Error" in result['msg']:
-            module.fail_json(result['msg'])
-        else:          
+            result['failed'] = True
+        else:
             result['changed'] = True
 
+    return result
+
+def run_module():
+
+    module_args = dict(
+        name=dict(type='str'),
+        names=dict(type='list', elements='str'),
+        pattern=dict(type='str'),
+        regex=dict(type='bool', default=False),
+        state=dict(type='str', required=True, choices=['started', 'stopped', 'reset', 'paused','unpaused']),
+        startwith=dict(type='str', choices=['gui', 'nogui'], default='nogui'),
+        force=dict(type='bool', default= False),
+        workers=dict(type='int', default=8)
+    )
+
+    result = dict(
+        changed=False,
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        mutually_exclusive=[
+            ('name', 'names', 'pattern')
+        ],
+        required_one_of=[
+            ('name', 'names', 'pattern')
+        ],
+        supports_check_mode=True
+    )
+
+    host = HostContext(concurrency= module.params['workers'])
+    vms = VM.select(host, module.params['name'], module.params['names'], module.params['pattern'], module.params['regex'])
+
+    # One vmrun list for all virtual machines
+    try:
+        states = PowerState(VMWare(host)).evaluate(vms)
+    except Exception as e:
+        module.fail_json(str(e), **result)
+    vmresults = host.executor.gather(*[power(vm, states[vm.name], module.params, module.check_mode) for vm in vms])
+    vmresults = [dict(name= vm.name, changed= False, failed= True, msg= str(vmresult)) if isinstance(vmresult, Exception) else vmresult for vm, vmresult in zip(vms, vmresults)]
+
+    if module.params['name'] != None:
+        vmresult = vmresults[0]
+        vmresult.pop('name')
+        failed = vmresult.pop('failed', False)
+        result.update(vmresult)
+        if failed:
+            module.fail_json(**result)
+        module.exit_json(**result)
+
+    result['vms'] = vmresults
+    result['changed'] = any(vmresult['changed'] for vmresult in vmresults)
+    failed = [vmresult['name'] for vmresult in vmresults if vmresult.get('failed', False)]
+    if len(failed) > 0:
+        module.fail_json("Power transition failed for {}".format(', '.join(failed)), **result)
+
     module.exit_json(**result)
 
 def main():
@@ -0,0 +1,147 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Eddy Vermoen (@ben-eddy74)
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: vmware_wpro_vmx_config
+
+short_description: Configure the vmx file of virtual machines
+version_added: "1.0.0"
+
+description: This module sets and removes vmx configuration keys of one or more virtual machines.
+             All changes of a virtual machine are applied with a single read and write of its vmx file,
+             and the virtual machines are processed in parallel.
+             VMware Workstation may overwrite changes made to the vmx file of a running virtual machine.
+
+options:
+    name:
+        description: The name of the virtual machine
+        type: str
+    names:
+        description: The names of the virtual machines
+        type: list
+        elements: str
+    set:
+        description: The vmx keys and their values to set, booleans are written as TRUE or FALSE
+        type: dict
+        default: {}
+    remove:
+        description: The vmx keys to remove
+        type: list
+        elements: str
+        default: []
+    workers:
+        description: Maximum number of virtual machines configured in parallel
+        type: int
+        default: 8
+
+author:
+    - Eddy Vermoen (@ben-eddy74)
+'''
+
+EXAMPLES = r'''
+- name: Resize memory and cpu of the lab VMs
+  ben_eddy74.vmware_wpro.vmware_wpro_vmx_config:
+    names:
+      - lab-01
+      - lab-02
+    set:
+      memsize: 8192
+      numvcpus: 4
+    remove:
+      - sata0:1.fileName
+'''
+
+RETURN = r'''
+vms:
+    description: The changed keys per virtual machine, after is null for removed keys
+    type: list
+    returned: always
+    sample: '
+        "changed": true,
+        "vms": [
+            {
+                "name": "lab-01",
+                "changed": true,
+                "diff": {
+                    "memsize": {
+                        "before": "4096",
+                        "after": "8192"
+                    }
+                }
+            }
+        ]
+    '
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+try:
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware import HostContext
+    from ansible_collections.ben_eddy74.vmware_wpro.plugins.module_utils.vmware_vm import VM
+except:
+    from module_utils.vmware import HostContext
+    from module_utils.vmware_vm import VM
+
+def configure(vm, config, remove, check_mode):
+    """Applies the configuration to one virtual machine and returns its result"""
+    if vm.exists() == False:
+        return dict(name= vm.name, changed= False, failed= True, msg= "VM {} not found".format(vm.name))
+
+    diff = vm.setVmxConfig(config, remove, dryrun= check_mode)
+    return dict(name= vm.name, changed= len(diff) > 0, diff= diff)
+
+def run_module():
+
+    module_args = dict(
+        name=dict(type='str'),
+        names=dict(type='list', elements='str'),
+        set=dict(type='dict', default={}),
+        remove=dict(type='list', elements='str', default=[]),
+        workers=dict(type='int', default=8)
+    )
+
+    result = dict(
+        changed=False,
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        mutually_exclusive=[
+            ('name', 'names')
+        ],
+        required_one_of=[
+            ('name', 'names')
+        ],
+        supports_check_mode=True
+    )
+
+    config = dict()
+    for k, v in module.params['set'].items():
+        if isinstance(v, bool):
+            v = "TRUE" if v else "FALSE"
+        config[k] = str(v)
+
+    names = module.params['names'] if module.params['names'] != None else [module.params['name']]
+    host = HostContext(concurrency= module.params['workers'])
+    vms = [VM(name, host) for name in names]
+
+    vmresults = host.executor.gather(*[host.executor.thread(configure, vm, config, module.params['remove'], module.check_mode) for vm in vms])
+    vmresults = [dict(name= vm.name, changed= False, failed= True, msg= str(vmresult)) if isinstance(vmresult, Exception) else vmresult for vm, vmresult in zip(vms, vmresults)]
+
+    result['vms'] = vmresults
+    result['changed'] = any(vmresult['changed'] for vmresult in vmresults)
+    failed = [vmresult['name'] for vmresult in vmresults if vmresult.get('failed', False)]
+    if len(failed) > 0:
+        module.fail_json("Configuration failed for {}".format(', '.join(failed)), **result)
+
+    module.exit_json(**result)
+
+def main():
+    run_module()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+#!/usr/bin/bash
+# Local stand-in for the powershell interop bridge, runs the received commands with sh.
+# Usage: VMWARE_WPRO_BRIDGE=../tests/bridge.sh python -m modules.vmware_wpro_info ../tests/info.json
+tmp=$(mktemp -d)
+trap 'rm -rf "$tmp"' EXIT
+while read -r token command; do
+    printf '%s' "$command" | base64 -d > "$tmp/command"
+    sh "$tmp/command" > "$tmp/stdout" 2> "$tmp/stderr" < /dev/null
+    rc=$?
+    printf '%s %s %s %s\n' "$token" "$rc" "$(base64 -w0 < "$tmp/stdout")" "$(base64 -w0 < "$tmp/stderr")"
+done